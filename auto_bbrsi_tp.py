@@ -4,11 +4,16 @@
 import argparse
 import sys
 
+from indicators import IndicatorEngine
+from trading_plan import LOOKBACK_BARS
 from trading_plan import TradingPlan
-from utils import (btc2str, ATR_STP, BB, MA, RSI, red, green)
+from utils import (btc2str, red, green)
 
 
 class AutoBBRsiTradingPlan(TradingPlan):
+    checkpoint_fields = ('status', 'amount', 'entry', 'virtual_stop',
+                         'physical_stop', 'cost', 'quantity')
+
     def __init__(self, exch, name, arguments, buy):
         parser = argparse.ArgumentParser(prog=name)
         parser.add_argument(
@@ -38,23 +43,22 @@ class AutoBBRsiTradingPlan(TradingPlan):
         self.physical_stop = None
         self.cost = 0
         self.quantity = 0
+        self.indicators = IndicatorEngine(self.period)
+        self.lookback = LOOKBACK_BARS * self.period
 
         super().__init__(exch, name, arguments, buy)
 
         self.ticks = self.init_dataframes()
+        self.restore_checkpoint()
 
         self.log('%s amount=%s period=%d mn percent=%.2f%%' %
                  (name, btc2str(self.amount), self.period, self.percent * 100))
 
     def process_tick(self):
         self.update_dataframe(self.tick)
-        ndf = self.resample_dataframes(self.period)
-        BB(ndf)
-        MA(ndf, 20, 'V', 'VMA20')
-        RSI(ndf)
-        ATR_STP(ndf)
-        last_row = ndf.iloc[-2]
+        return self.process_row(self.indicators.last_row)
 
+    def process_row(self, last_row):
         # Put a stop if needed but let the trade logic continue if it is not
         # reached
         self.check_stop(self.tick)
@@ -74,7 +78,6 @@ class AutoBBRsiTradingPlan(TradingPlan):
                   self.amount, self.quantity, btc2str(self.entry),
                   btc2str(self.virtual_stop), btc2str(self.physical_stop),
                   percent))
-        del ndf
         return(self.amount > 0)
 
     def check_stop(self, tick):
@@ -118,9 +121,9 @@ class AutoBBRsiTradingPlan(TradingPlan):
             self.log('No buy order. Aborting.')
             sys.exit(1)
         self.log('Recovered order %s' % buy_order)
-        if self.balance < buy_order.data['Quantity']:
+        if self.balance < buy_order.quantity:
             self.log('Invalid balance %s < %s. Aborting' %
-                     (self.balance, buy_order.data['Quantity']))
+                     (self.balance, buy_order.quantity))
             sys.exit(1)
         self.status = 'buying'
 
@@ -176,9 +179,9 @@ class AutoBBRsiTradingPlan(TradingPlan):
                 self.log('Unable to find buy order. Aborting.')
                 sys.exit(1)
             buy_order = past_orders[0]
-            self.entry = buy_order.data['PricePerUnit']
-            self.quantity = buy_order.data['Quantity']
-            self.cost = buy_order.data.get('Commission', 0)
+            self.entry = buy_order.price_per_unit
+            self.quantity = buy_order.quantity
+            self.cost = buy_order.commission
             self.log("bought %f @ %s Fees %s" %
                      (self.quantity, btc2str(self.entry),
                       btc2str(self.cost)))
@@ -220,9 +223,9 @@ class AutoBBRsiTradingPlan(TradingPlan):
             self.compute_gains(tick, past_orders[0])
 
     def compute_gains(self, tick, order):
-        price = order.data['PricePerUnit']
-        quantity = order.data['Quantity']
-        self.cost += order.data['Commission']
+        price = order.price_per_unit
+        quantity = order.quantity
+        self.cost += order.commission
         amount = price * quantity - self.cost
         self.log('sold %f @ %s => %f %f %.2f%% (buy price=%s)' %
                  (quantity, btc2str(price),
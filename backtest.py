@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+'''
+'''
+
+import argparse
+import contextlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from candles import COLUMNS
+from replay import create_plan
+from replay import load_trade
+from replay import replay
+from replay import start_index
+from resampler import resample_arrays
+from tradefile import CandleColumns
+from utils import ATR_STP, BB, MA, RSI, btc2str
+
+
+def candle_arrays(candles):
+    if isinstance(candles, CandleColumns):
+        return candles.times, candles.values
+    times = np.array([candle['T'] for candle in candles],
+                     dtype='datetime64[s]').astype(np.int64)
+    values = dict((col, np.array([candle[col] for candle in candles],
+                                 dtype=np.float64))
+                  for col in COLUMNS)
+    return times, values
+
+
+def compute_rows(candles, period):
+    """
+    Resample the whole series and compute the indicators of all the
+    bars in one pass. Returns the bar index of each candle and the rows
+    of the bars, with the same columns as IndicatorEngine.last_row.
+    """
+    times, values = candle_arrays(candles)
+    bucket, bars = resample_arrays(times, values, period)
+    df = pd.DataFrame(bars, columns=COLUMNS)
+    BB(df)
+    MA(df, 20, 'V', 'VMA20')
+    RSI(df)
+    ATR_STP(df)
+    columns = list(df.columns)
+    rows = [dict(zip(columns, row))
+            for row in zip(*[df[col].tolist() for col in columns])]
+    return bucket, rows
+
+
+def backtest(exch, trading_plan, candles, idx, rows=None):
+    """
+    Drive the state machine of the trading plan with the precomputed
+    rows instead of letting it update its indicators on each tick.
+    """
+    if rows is None:
+        rows = compute_rows(candles, trading_plan.period)
+    bucket, rows = rows
+    for pos in range(idx, len(candles)):
+        tick = candles[pos]
+        exch.candles.append(tick)
+        exch.process_tick(tick)
+        trading_plan.tick = tick
+        # the last closed bar is the one before the bar of the tick
+        bar = bucket[pos]
+        last_row = rows[bar - 1] if bar > 0 else None
+        if not trading_plan.process_row(last_row):
+            break
+
+
+def run(data, plan, args, fast=True, rows=None):
+    """
+    Run a trading plan on the content of a trade file. The tick by
+    tick replay modifies the candles so data must not be reused after
+    it.
+    """
+    candles = data['candles']
+    idx = start_index(candles)
+    exch, trading_plan = create_plan(data, plan, args, idx)
+    if fast and hasattr(trading_plan, 'process_row'):
+        backtest(exch, trading_plan, candles, idx, rows)
+    else:
+        if fast:
+            print('%s has no fast path, replaying tick by tick' %
+                  trading_plan.name)
+        replay(exch, trading_plan, candles[idx:])
+    return exch, trading_plan
+
+
+def display_fills(fills):
+    for fill in fills:
+        print('%s %s => %.3f @ %s' % (fill[0], fill[2], fill[3],
+                                      btc2str(fill[4])))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backtest a trading plan on a trade file computing '
+        'all the indicators in one pass.')
+    parser.add_argument('-c', '--compare',
+                        help='also replay tick by tick and check that the '
+                        'trades are identical',
+                        action='store_true')
+    parser.add_argument('-q', '--quiet',
+                        help='do not display the logs of the trading plan',
+                        action='store_true')
+    parser.add_argument('plan', help='trading plan or - to use the one '
+                        'stored in the trade file')
+    parser.add_argument('filename', help='trade file')
+    parser.add_argument('args', nargs=argparse.REMAINDER,
+                        help='arguments of the trading plan')
+    args = parser.parse_args()
+
+    if args.quiet:
+        output = open(os.devnull, 'w')
+    else:
+        output = sys.stdout
+
+    with contextlib.redirect_stdout(output):
+        exch, trading_plan = run(load_trade(args.filename), args.plan,
+                                 args.args)
+    display_fills(exch.fills)
+    if hasattr(trading_plan, 'amount'):
+        print('Final amount: %f' % trading_plan.amount)
+
+    if args.compare:
+        with contextlib.redirect_stdout(output):
+            ref_exch, _ = run(load_trade(args.filename), args.plan,
+                              args.args, False)
+        if [fill[:3] for fill in exch.fills] != \
+           [fill[:3] for fill in ref_exch.fills]:
+            print('Trades differ from the tick by tick replay:')
+            display_fills(ref_exch.fills)
+            sys.exit(1)
+        print('Same %d trades as the tick by tick replay' % len(exch.fills))
+
+
+if __name__ == "__main__":
+    main()
+
+# backtest.py ends here
@@ -1,6 +1,14 @@
 '''
 '''
 
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
 from tenacity import retry
 from tenacity import retry_if_exception_type
 from tenacity import wait_exponential
@@ -10,11 +18,39 @@ from bittrex.bittrex import Bittrex
 
 from exchange import Exchange
 from exchange import Order
+from order_store import ORDER_DB
+from order_store import OrderStore
+from ratelimit import HISTORY
+from ratelimit import ORDER
+from ratelimit import READ
+from ratelimit import TokenBucket
 from utils import btc2str
 
 # Settings for retry
 MAX_DELAY = 30
 
+# Settings for the confirmation of the cancels: first and max delay
+# between two checks of the order, total time allowed and number of
+# cancels confirmed in parallel
+CANCEL_FIRST_DELAY = 0.2
+CANCEL_MAX_DELAY = 5
+CANCEL_DEADLINE = 30
+CONFIRM_WORKERS = 4
+
+# Settings for the HTTP connections, shared by all the exchanges of a
+# process
+POOL_SIZE = int(os.getenv('TBOT_HTTP_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.getenv('TBOT_HTTP_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('TBOT_HTTP_READ_TIMEOUT', 10))
+
+# Settings for the rate limiter: requests per second and burst, shared
+# by the processes using the same lock file (empty to not share)
+RATE_LIMIT = float(os.getenv('TBOT_RATE_LIMIT', 1))
+RATE_BURST = float(os.getenv('TBOT_RATE_BURST', 5))
+RATE_LOCK_FILE = os.getenv('TBOT_RATE_LOCK_FILE',
+                           os.path.join(tempfile.gettempdir(),
+                                        'tbot-bittrex.rate'))
+
 
 class BittrexError(Exception):
     pass
@@ -24,11 +60,117 @@ class BittrexRetryableError(BittrexError):
     pass
 
 
+def request_priority(request_url):
+    path = request_url.split('?')[0].lower()
+    if path.endswith(('/tradebuy', '/tradesell', '/tradecancel')):
+        return ORDER
+    if '/key/balance/' in path or path.endswith('/getorderhistory'):
+        return HISTORY
+    return READ
+
+
+class SessionDispatch(object):
+    """
+    Send the requests of the Bittrex client through a session keeping
+    its connections alive instead of opening one per request. Requests
+    wait for the limiter if any.
+    """
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, limiter=None):
+        self.limiter = limiter
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(pool_connections=pool_size,
+                                   pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def __call__(self, request_url, apisign):
+        if self.limiter:
+            self.limiter.acquire(request_priority(request_url))
+        return self.session.get(request_url,
+                                headers={'apisign': apisign},
+                                timeout=self.timeout).json()
+
+    def stats(self):
+        pools = self.adapter.poolmanager.pools
+        pools = [pools[key] for key in pools.keys()]
+        reqs = sum(pool.num_requests for pool in pools)
+        connections = sum(pool.num_connections for pool in pools)
+        stats = {'requests': reqs,
+                 'connections': connections,
+                 'reuse_rate': 1 - connections / reqs if reqs else 0}
+        if self.limiter:
+            limiter_stats = self.limiter.stats()
+            stats['throttled'] = limiter_stats['throttled']
+            stats['waited'] = limiter_stats['waited']
+        return stats
+
+
+_dispatch = None
+_executor = None
+
+
+def shared_dispatch():
+    global _dispatch
+    if _dispatch is None:
+        _dispatch = SessionDispatch(
+            limiter=TokenBucket(RATE_LIMIT, RATE_BURST, RATE_LOCK_FILE))
+    return _dispatch
+
+
+def confirm_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(CONFIRM_WORKERS)
+    return _executor
+
+
 def bittrex_retry():
     return retry(wait=wait_exponential(max=MAX_DELAY),
                  retry=retry_if_exception_type(BittrexRetryableError))
 
 
+class SummaryCandles(object):
+    """
+    Build the current 1 minute candle of each market from successive
+    market summaries: open, high, low and close from the last prices
+    seen during the minute and volumes from the increase of the 24
+    hours volumes. No candle is built for a market until a first
+    summary gives the reference volumes.
+    """
+    def __init__(self):
+        self.candles = {}
+        self.volumes = {}
+
+    def update(self, summary):
+        pair = summary['MarketName']
+        last = summary.get('Last')
+        volumes = (summary.get('Volume'), summary.get('BaseVolume'))
+        prev_volumes = self.volumes.get(pair)
+        self.volumes[pair] = volumes
+        if (last is None or not summary.get('TimeStamp') or
+           None in volumes or prev_volumes is None):
+            self.candles.pop(pair, None)
+            return None
+        minute = summary['TimeStamp'][:16] + ':00'
+        candle = self.candles.get(pair)
+        if candle and minute < candle['T']:
+            return dict(candle)
+        if candle is None or candle['T'] != minute:
+            candle = {'T': minute, 'O': last, 'H': last, 'L': last,
+                      'C': last, 'V': 0, 'BV': 0}
+            self.candles[pair] = candle
+        else:
+            candle['H'] = max(candle['H'], last)
+            candle['L'] = min(candle['L'], last)
+            candle['C'] = last
+        # the 24 hours volumes decrease when old trades leave the window
+        candle['V'] += max(volumes[0] - prev_volumes[0], 0)
+        candle['BV'] += max(volumes[1] - prev_volumes[1], 0)
+        return dict(candle)
+
+
 class BittrexExchange(Exchange):
     def __init__(self, auth=False):
         if auth:
@@ -38,7 +180,12 @@ class BittrexExchange(Exchange):
         else:
             api_key = None
             api_secret = None
-        self.conn = Bittrex(api_key, api_secret, api_version=API_V2_0)
+        # paced by the rate limiter of the dispatch
+        self.conn = Bittrex(api_key, api_secret, dispatch=shared_dispatch(),
+                            calls_per_second=float('inf'),
+                            api_version=API_V2_0)
+        self.summary_candles = SummaryCandles()
+        self.order_store = None
 
     @bittrex_retry()
     def sell_limit(self, pair, quantity, value):
@@ -86,6 +233,25 @@ class BittrexExchange(Exchange):
         self._validate_req(req, 'Unable to get tick')
         return req['result'][0]
 
+    @bittrex_retry()
+    def get_ticks(self, pairs):
+        req = self.conn.get_market_summaries()
+        self._validate_req(req, 'Unable to get market summaries')
+        summaries = {}
+        for entry in req['result']:
+            summary = entry.get('Summary', entry)
+            summaries[summary['MarketName']] = summary
+        ticks = {}
+        for pair in pairs:
+            tick = None
+            if pair in summaries:
+                tick = self.summary_candles.update(summaries[pair])
+            if tick is None:
+                # not enough detail in the summaries yet
+                tick = self.get_tick(pair)
+            ticks[pair] = tick
+        return ticks
+
     @bittrex_retry()
     def get_candles(self, pair, duration):
         req = self.conn.get_candles(pair, duration)
@@ -103,28 +269,60 @@ class BittrexExchange(Exchange):
     def get_order_history(self, pair=None):
         req = self.conn.get_order_history(pair)
         self._validate_req(req, 'Unable to get order history')
+        history = req['result']
+        if ORDER_DB and self.order_store is None:
+            self.order_store = OrderStore(ORDER_DB)
+        if self.order_store:
+            # the API has no since parameter: only the orders not yet
+            # stored are inserted and the history is read back locally
+            self.order_store.sync(history)
+            history = self.order_store.history(pair)
         return [BittrexOrder(data, id=data['OrderUuid'])
-                for data in req['result']]
+                for data in history]
 
-    @bittrex_retry()
     def cancel_order(self, order):
+        return self.cancel_order_async(order).result()
+
+    def cancel_order_async(self, order):
+        '''
+        Request the cancel and return a future completed when the order
+        is confirmed closed.
+        '''
+        if not self._request_cancel(order):
+            future = Future()
+            future.set_result(True)
+            return future
+        return confirm_executor().submit(self.confirm_cancel, order)
+
+    @bittrex_retry()
+    def _request_cancel(self, order):
         req = self.conn.cancel(order.id)
         try:
             self._validate_req(req, 'Unable to cancel order')
         except BittrexError as error:
             if error.args[0] == 'ORDER_NOT_OPEN':
-                return True
+                return False
             else:
                 raise error
+        return True
+
+    def confirm_cancel(self, order, deadline=CANCEL_DEADLINE):
+        end = time.time() + deadline
+        delay = CANCEL_FIRST_DELAY
         while True:
             req = self.conn.get_order(order.id)
-            self._validate_req(req,
-                               'Unable to get status of the canceled order')
-            if (('status' in req and req['status'] is None) or
-                ('result' in req and 'IsOpen' in req['result'] and
-                 req['result']['IsOpen'] is False)):
-                break
-        return True
+            if self._validate_req(req,
+                                  'Unable to get status of the canceled order',
+                                  do_raise=False):
+                if req['result'] is None:
+                    return True
+                if req['result'].get('IsOpen') is False:
+                    order.update(req['result'])
+                    return True
+            if time.time() + delay > end:
+                raise BittrexError('CANCEL_NOT_CONFIRMED')
+            time.sleep(delay)
+            delay = min(delay * 2, CANCEL_MAX_DELAY)
 
     @bittrex_retry()
     def get_balances(self):
@@ -163,48 +361,66 @@ class BittrexExchange(Exchange):
 
 
 class BittrexOrder(Order):
+    # The fields used by the tools are parsed once into slots. The
+    # response of the API stays available in data.
+    __slots__ = ('_data', 'pair', 'side', 'is_conditional', 'condition',
+                 'limit', 'target', 'quantity', 'remaining',
+                 'price_per_unit', 'price', 'commission', 'is_open',
+                 'closed')
+
     # Called by the metaclass to update an existing order. Must have
     # the same signature as __init__. id is a mandatory kwarg.
     def update(self, data, id=None):
-        self.data = data
+        self._data = data
+        get = data.get
+        self.pair = get('Exchange') or get('MarketName')
+        order_type = '%s %s' % (get('OrderType'), get('BuyOrSell'))
+        self.side = 'BUY' if 'BUY' in order_type.upper() else 'SELL'
+        self.condition = get('Condition') or 'NONE'
+        self.is_conditional = bool(get('IsConditional') or
+                                   self.condition != 'NONE')
+        self.limit = get('Limit', get('Rate'))
+        self.target = get('ConditionTarget')
+        self.quantity = get('Quantity')
+        self.remaining = get('QuantityRemaining', self.quantity)
+        self.price_per_unit = get('PricePerUnit')
+        self.price = get('Price')
+        self.commission = get('Commission', get('CommissionPaid')) or 0
+        self.closed = get('Closed')
+        self.is_open = get('IsOpen', self.closed is None)
+
+    @property
+    def data(self):
+        return self._data
+
+    def is_closed(self):
+        return self.closed is not None or self.is_open is False
 
     def is_sell_order(self):
-        return self.data['OrderType'] == 'LIMIT_SELL'
+        return self.side == 'SELL'
 
     def is_buy_order(self):
-        return self.data['OrderType'] == 'LIMIT_BUY'
+        return self.side == 'BUY'
 
     def __str__(self):
-        d = self.data
-        quantity = d['Quantity']
-        price = btc2str(d['Limit'])
-        if d['OrderType'] == 'LIMIT_BUY':
-            if d['IsConditional']:
+        price = btc2str(self.limit)
+        if self.side == 'BUY':
+            if self.is_conditional:
                 return('BUY STPLMT %.3f %s @ %s-%s' %
-                       (quantity, d['Exchange'],
-                        btc2str(d['ConditionTarget']),
+                       (self.quantity, self.pair,
+                        btc2str(self.target),
                         price))
             else:
                 return('BUY LMT %.3f %s @ %s' %
-                       (quantity, d['Exchange'],
+                       (self.quantity, self.pair,
                         price))
         else:
-            if d['Condition'] != 'NONE':
+            if self.is_conditional:
                 order_type = 'STP'
-                price = btc2str(d['ConditionTarget'])
+                price = btc2str(self.target)
             else:
                 order_type = 'LMT'
-                price = btc2str(d['Limit'])
-            return 'SELL %s %.3f %s @ %s' % (order_type, quantity,
-                                             d['Exchange'], price)
-
-    def quantity(self):
-        return self.data['Quantity']
-
-    def limit(self):
-        return self.data['Limit']
-
-    def price_per_unit(self):
-        return self.data['PricePerUnit']
+            return 'SELL %s %.3f %s @ %s' % (order_type, self.quantity,
+                                             self.pair, price)
 
 # BittrexExchange.py ends here
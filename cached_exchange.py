@@ -0,0 +1,126 @@
+'''
+'''
+
+import threading
+import time
+
+# seconds during which a read is reused
+CACHE_TTL = 10
+
+# calls changing the orders or the positions
+WRITES = ('sell_limit', 'sell_market', 'sell_stop', 'buy_limit',
+          'buy_limit_range', 'cancel_order', 'submit_orders')
+
+
+class CachedExchange(object):
+    """
+    Reuse the open orders, positions and order history read during the
+    same tick, and for at most ttl seconds. Our own orders and cancels,
+    a new tick or an order seen closed by update_order invalidate the
+    cache. Other calls go straight to the exchange. The cache is
+    shared with the threads confirming the cancels so it is only
+    accessed under a lock, and a read started before an invalidation
+    is not kept.
+    """
+    def __init__(self, exch, ttl=CACHE_TTL, clock=time.time):
+        self.exch = exch
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.cache = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        if name == 'exch':
+            raise AttributeError(name)
+        attr = getattr(self.exch, name)
+        if name in WRITES:
+            def write(*args, **kwargs):
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    self.invalidate()
+            return write
+        return attr
+
+    def invalidate(self):
+        with self.lock:
+            self.cache.clear()
+            self.generation += 1
+
+    def fetch(self, func, *args):
+        key = (func.__name__,) + args
+        now = self.clock()
+        with self.lock:
+            entry = self.cache.get(key)
+            generation = self.generation
+        if entry and now - entry[0] <= self.ttl:
+            self.hits += 1
+        else:
+            self.misses += 1
+            entry = (now, func(*args))
+            with self.lock:
+                if generation == self.generation:
+                    self.cache[key] = entry
+        return entry
+
+    def cached(self, func, *args):
+        result = self.fetch(func, *args)[1]
+        if isinstance(result, list):
+            return list(result)
+        return result
+
+    def get_tick(self, pair):
+        self.invalidate()
+        return self.exch.get_tick(pair)
+
+    def get_ticks(self, pairs):
+        self.invalidate()
+        return self.exch.get_ticks(pairs)
+
+    def get_open_orders(self, pair):
+        with self.lock:
+            prev = self.cache.get(('get_open_orders', pair))
+        entry = self.fetch(self.exch.get_open_orders, pair)
+        if prev and prev is not entry:
+            if set(order.id for order in prev[1]) != \
+               set(order.id for order in entry[1]):
+                # filled or canceled outside: the other reads are stale
+                key = ('get_open_orders', pair)
+                with self.lock:
+                    kept = self.cache.get(key) is entry
+                    self.invalidate()
+                    if kept:
+                        self.cache[key] = entry
+        return list(entry[1])
+
+    def get_position(self, pair):
+        return self.cached(self.exch.get_position, pair)
+
+    def get_order_history(self, pair=None):
+        return self.cached(self.exch.get_order_history, pair)
+
+    def cancel_order_async(self, order):
+        self.invalidate()
+        future = self.exch.cancel_order_async(order)
+        future.add_done_callback(lambda future: self.invalidate())
+        return future
+
+    def update_order(self, order):
+        order = self.exch.update_order(order)
+        if order.is_closed():
+            with self.lock:
+                # closed since we read the open orders
+                stale = any(key[0] == 'get_open_orders' and order in entry[1]
+                            for key, entry in self.cache.items())
+            if stale:
+                self.invalidate()
+        return order
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# cached_exchange.py ends here
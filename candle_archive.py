@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+'''
+Local archive of the 1 minute candles seen for each pair. The archive
+of a pair is a directory with one file per column (T as int64
+seconds since the epoch, then O, H, L, C, V and BV as float64) that
+only grows at the end and is memory mapped to be read.
+
+Plans warm up from the archive and the exchange is only asked for
+candles when the archive does not reach the last closed minute. As
+the Bittrex API cannot return a range of candles, the missing tail
+is then fetched with the usual full download.
+
+The archives are shared by the plans of a process and by the trade.py
+processes using the same directory: every access takes the lock file
+of the archive and first catches up with the candles appended by the
+others.
+
+Export the archive of a pair to a trade file for replay.py with::
+
+  ./candle_archive.py BTC-ETH BTC-ETH.ctrade
+'''
+
+import contextlib
+import fcntl
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from candles import COLUMNS
+from tradefile import CandleColumns
+from tradefile import write_columnar
+from utils import candle_time
+
+# directory of the archives, empty to disable them
+CANDLE_DIR = os.getenv('TBOT_CANDLE_DIR', 'candles')
+# number of candles returned by get_candles (2 weeks)
+ARCHIVE_WINDOW = 14 * 24 * 60
+
+DTYPES = dict([('T', '<i8')] + [(col, '<f8') for col in COLUMNS])
+
+
+class CandleArchive(object):
+    """
+    Append only columnar storage of the candles of a pair. A candle
+    with the time of the last one replaces it, older candles are
+    ignored.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.fd = os.open(os.path.join(path, 'lock'), os.O_RDWR | os.O_CREAT,
+                          0o644)
+        self.files = {}
+        for col in DTYPES:
+            filename = os.path.join(path, col)
+            mode = 'r+b' if os.path.exists(filename) else 'w+b'
+            self.files[col] = open(filename, mode)
+        self.count = 0
+        self.last = None
+        # read the size and the last candle of the files
+        with self.locked():
+            pass
+
+    def __len__(self):
+        return self.count
+
+    @contextlib.contextmanager
+    def locked(self):
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _sync(self):
+        # candles appended by another process since the last access
+        sizes = [os.fstat(fobj.fileno()).st_size
+                 for fobj in self.files.values()]
+        count = min(sizes) // 8
+        if count == self.count and max(sizes) == count * 8:
+            return
+        # drop the columns of a candle partially written by a crash
+        for fobj, size in zip(self.files.values(), sizes):
+            if size != count * 8:
+                fobj.truncate(count * 8)
+        self.count = count
+        self.last = None
+        if self.count:
+            self.last = int(self.read_column('T', self.count - 1)[0])
+
+    def read_column(self, col, start=0, count=None):
+        if count is None:
+            count = self.count
+        return np.memmap(self.files[col].name, dtype=DTYPES[col], mode='r',
+                         offset=start * 8, shape=(count - start,))
+
+    def last_time(self):
+        with self.locked():
+            return self.last
+
+    def _append(self, candle):
+        ts = candle_time(candle)
+        if self.last is not None and ts < self.last:
+            return False
+        pos = self.count
+        if ts == self.last:
+            pos -= 1
+        for col, fobj in self.files.items():
+            value = ts if col == 'T' else candle[col]
+            fobj.seek(pos * 8)
+            fobj.write(np.array(value, dtype=DTYPES[col]).tobytes())
+            fobj.flush()
+        self.count = pos + 1
+        self.last = ts
+        return True
+
+    def append(self, candle):
+        with self.locked():
+            return self._append(candle)
+
+    def extend(self, candles):
+        count = 0
+        with self.locked():
+            for candle in candles:
+                if self.last is None or candle_time(candle) > self.last:
+                    self._append(candle)
+                    count += 1
+        return count
+
+    def candles(self, window=None):
+        """
+        Memory mapped candles, the last window ones if set.
+        """
+        with self.locked():
+            count = self.count
+        start = 0
+        if window and count > window:
+            start = count - window
+        if count == start:
+            return CandleColumns(np.empty(0, dtype='<i8'),
+                                 dict((col, np.empty(0, dtype='<f8'))
+                                      for col in COLUMNS))
+        return CandleColumns(self.read_column('T', start, count),
+                             dict((col, self.read_column(col, start, count))
+                                  for col in COLUMNS))
+
+    def export(self, filename, pair):
+        write_columnar(filename, {'candles': self.candles(), 'plan': None,
+                                  'pair': pair, 'balance': 0,
+                                  'available': 0, 'args': []})
+
+    def close(self):
+        for fobj in self.files.values():
+            fobj.close()
+        os.close(self.fd)
+
+
+class ArchiveExchange(object):
+    """
+    Exchange serving the 1 minute candles from the archives when they
+    are up to date and adding the downloaded ones to them otherwise.
+    archive_candle stores the candles seen by the tick loops. The
+    other calls go to the underlying exchange.
+    """
+    def __init__(self, exch, directory=CANDLE_DIR, window=ARCHIVE_WINDOW,
+                 clock=time.time):
+        self.exch = exch
+        self.directory = directory
+        self.window = window
+        self.clock = clock
+        self.archives = {}
+        self.lock = threading.Lock()
+        self.local = 0
+        self.downloads = 0
+
+    def __getattr__(self, name):
+        if name == 'exch':
+            raise AttributeError(name)
+        return getattr(self.exch, name)
+
+    def archive(self, pair):
+        with self.lock:
+            if pair not in self.archives:
+                self.archives[pair] = CandleArchive(
+                    os.path.join(self.directory, pair))
+            return self.archives[pair]
+
+    def archive_candle(self, pair, candle):
+        return self.archive(pair).append(candle)
+
+    def get_candles(self, pair, duration):
+        if duration != 'oneMin':
+            return self.exch.get_candles(pair, duration)
+        archive = self.archive(pair)
+        last = archive.last_time()
+        # start of the last closed minute
+        closed = int(self.clock()) // 60 * 60 - 60
+        if last is None or last < closed:
+            self.downloads += 1
+            archive.extend(self.exch.get_candles(pair, duration))
+        else:
+            self.local += 1
+        return list(archive.candles(self.window))
+
+    def stats(self):
+        return {'local': self.local, 'downloads': self.downloads}
+
+
+def archive_exchange(exch):
+    '''
+    Keep the candles in TBOT_CANDLE_DIR unless it is empty.
+    '''
+    if CANDLE_DIR:
+        return ArchiveExchange(exch)
+    return exch
+
+
+def main(args):
+    if len(args) != 2:
+        print('Usage: %s <pair> <output trade file>' % sys.argv[0])
+        sys.exit(1)
+    archive = CandleArchive(os.path.join(CANDLE_DIR, args[0]))
+    archive.export(args[1], args[0])
+    print('%d candles saved in %s' % (len(archive), args[1]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+# candle_archive.py ends here
@@ -0,0 +1,79 @@
+'''
+'''
+
+import numpy as np
+import pandas as pd
+
+from utils import candle_time
+
+COLUMNS = ('O', 'H', 'L', 'C', 'V', 'BV')
+
+
+class CandleBuffer(object):
+    """
+    Fixed size ring buffer of 1 minute candles backed by NumPy
+    arrays. Appending a candle is O(1) and does not allocate; the
+    oldest candle is dropped once the buffer is full. A dataframe is
+    only built when to_dataframe() is called.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.times = np.zeros(size, dtype=np.int64)
+        self.values = np.zeros((len(COLUMNS), size), dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self._frame = None
+
+    def __len__(self):
+        return self.count
+
+    def append(self, candle, ts=None):
+        if self.count < self.size:
+            idx = (self.start + self.count) % self.size
+            self.count += 1
+        else:
+            idx = self.start
+            self.start = (self.start + 1) % self.size
+        if ts is None:
+            ts = candle_time(candle)
+        self.times[idx] = ts
+        values = self.values
+        values[0, idx] = candle['O']
+        values[1, idx] = candle['H']
+        values[2, idx] = candle['L']
+        values[3, idx] = candle['C']
+        values[4, idx] = candle['V']
+        values[5, idx] = candle['BV']
+        self._frame = None
+
+    def extend(self, candles):
+        for candle in candles[-self.size:]:
+            self.append(candle)
+
+    def _ordered(self, array):
+        # return the content of a ring in chronological order
+        end = self.start + self.count
+        if end <= self.size:
+            return array[..., self.start:end]
+        return np.concatenate((array[..., self.start:],
+                               array[..., :end - self.size]), axis=-1)
+
+    def timestamps(self):
+        return self._ordered(self.times)
+
+    def column(self, name):
+        return self._ordered(self.values[COLUMNS.index(name)])
+
+    def to_dataframe(self):
+        if self._frame is None:
+            index = pd.to_datetime(self.timestamps(), unit='s')
+            index.name = 'T'
+            values = self._ordered(self.values)
+            self._frame = pd.DataFrame(
+                dict((name, values[idx])
+                     for idx, name in enumerate(COLUMNS)),
+                index=index, columns=COLUMNS)
+        return self._frame
+
+
+# candles.py ends here
@@ -4,6 +4,24 @@
 from abc import ABC
 from abc import ABCMeta
 from abc import abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import weakref
+
+
+# number of orders placed in parallel by submit_orders
+ORDER_WORKERS = 8
+
+_executor = None
+
+
+def order_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(ORDER_WORKERS)
+    return _executor
 
 
 class Exchange(ABC):
@@ -31,6 +49,13 @@ class Exchange(ABC):
     def get_tick(self, pair):
         pass
 
+    def get_ticks(self, pairs):
+        '''
+        Latest candle of each pair in a dict. Exchanges able to get
+        all the markets in one call override this.
+        '''
+        return dict((pair, self.get_tick(pair)) for pair in pairs)
+
     @abstractmethod
     def get_open_orders(self, pair):
         pass
@@ -39,6 +64,34 @@ class Exchange(ABC):
     def cancel_order(self, order):
         pass
 
+    def submit_orders(self, orders):
+        '''
+        Place orders concurrently. Each order is a tuple of the name of
+        the method placing it and its arguments. Return the placed
+        order or the exception raised for each one. The methods run on
+        the threads of the pool: exchanges that cannot place orders
+        from several threads override this.
+        '''
+        futures = [order_executor().submit(getattr(self, order[0]),
+                                           *order[1:])
+                   for order in orders]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as error:
+                results.append(error)
+        return results
+
+    def cancel_order_async(self, order):
+        '''
+        Future completed when the order is canceled. Exchanges able to
+        confirm the cancel in the background override this.
+        '''
+        future = Future()
+        future.set_result(self.cancel_order(order))
+        return future
+
     @abstractmethod
     def get_position(self, pair):
         pass
@@ -49,19 +102,52 @@ class Exchange(ABC):
 
 
 class OrderMeta(ABCMeta):
-    _orders = {}
+    """
+    Identity map of the orders: creating an order with the id of an
+    existing one updates and returns the existing object. Orders are
+    only kept while they are referenced, plus the max_closed last
+    closed orders to avoid recreating them on each history query.
+    Orders are built by several threads so the maps are only used
+    under a lock.
+    """
+    _lock = threading.Lock()
+    _orders = weakref.WeakValueDictionary()
+    _closed = OrderedDict()
+    max_closed = 1000
+    hits = 0
+    misses = 0
 
     def __call__(cls, *args, **kwargs):
         orderid = kwargs['id']
-        if orderid not in cls._orders:
-            cls._orders[orderid] = super(OrderMeta, cls).__call__(*args,
-                                                                  **kwargs)
-        else:
-            cls._orders[orderid].update(*args, **kwargs)
-        return cls._orders[orderid]
+        with OrderMeta._lock:
+            order = OrderMeta._orders.get(orderid)
+            if order is None:
+                OrderMeta.misses += 1
+                order = super(OrderMeta, cls).__call__(*args, **kwargs)
+                OrderMeta._orders[orderid] = order
+            else:
+                OrderMeta.hits += 1
+                order.update(*args, **kwargs)
+            if order.is_closed():
+                OrderMeta._closed[orderid] = order
+                OrderMeta._closed.move_to_end(orderid)
+                while len(OrderMeta._closed) > OrderMeta.max_closed:
+                    OrderMeta._closed.popitem(last=False)
+            else:
+                OrderMeta._closed.pop(orderid, None)
+            return order
+
+    def stats(cls):
+        with OrderMeta._lock:
+            return {'hits': OrderMeta.hits,
+                    'misses': OrderMeta.misses,
+                    'size': len(OrderMeta._orders),
+                    'closed': len(OrderMeta._closed)}
 
 
 class Order(ABC, metaclass=OrderMeta):
+    __slots__ = ('id', '__weakref__')
+
     def __init__(self, *args, **kwargs):
         self.id = kwargs['id']
         self.update(*args, **kwargs)
@@ -70,6 +156,9 @@ class Order(ABC, metaclass=OrderMeta):
     def update(*args, **kwargs):
         pass
 
+    def is_closed(self):
+        return False
+
     @abstractmethod
     def is_buy_order(self):
         return False
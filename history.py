@@ -3,35 +3,49 @@
 import sys
 
 from bittrex_exchange import BittrexExchange
+from bittrex_exchange import BittrexOrder
+from order_store import OrderStore
 
 
 def display_orders(orders):
     for order in orders:
-        if order.data['Condition'] != 'NONE':
+        if order.is_conditional:
             print('%s %s(%.3f) %s(%.8f) %s(%2.8f) => %.8f x %.3f = %.8f '
                   'Fees: %.8f' %
-                  (order.data['Closed'], order.data['Exchange'],
-                   order.data['Quantity'], order.data['OrderType'],
-                   order.data['Limit'], order.data['Condition'],
-                   order.data['ConditionTarget'], order.data['PricePerUnit'],
-                   order.data['Quantity'], order.data['Price'],
-                   order.data['Commission']))
+                  (order.closed, order.pair,
+                   order.quantity, 'LIMIT_' + order.side,
+                   order.limit, order.condition,
+                   order.target, order.price_per_unit,
+                   order.quantity, order.price,
+                   order.commission))
         else:
             print('%s %s(%.3f) %s(%.8f) => %.8f x %.3f = %.8f '
                   'Fees: %.8f' %
-                  (order.data['Closed'], order.data['Exchange'],
-                   order.data['Quantity'], order.data['OrderType'],
-                   order.data['Limit'], order.data['PricePerUnit'],
-                   order.data['Quantity'], order.data['Price'],
-                   order.data['Commission']))
+                  (order.closed, order.pair,
+                   order.quantity, 'LIMIT_' + order.side,
+                   order.limit, order.price_per_unit,
+                   order.quantity, order.price,
+                   order.commission))
 
 
-exch = BittrexExchange(True)
+def local_order_history(market=None):
+    return [BittrexOrder(data, id=data['OrderUuid'])
+            for data in OrderStore().history(market)]
 
-if len(sys.argv) > 1:
-    for market in sys.argv[1:]:
-        orders = exch.get_order_history(market)
+
+args = sys.argv[1:]
+
+if args and args[0] == '-l':
+    # orders stored by the previous runs, without any request
+    get_order_history = local_order_history
+    args = args[1:]
+else:
+    get_order_history = BittrexExchange(True).get_order_history
+
+if args:
+    for market in args:
+        orders = get_order_history(market)
         display_orders(orders)
 else:
-    orders = exch.get_order_history()
+    orders = get_order_history()
     display_orders(orders)
@@ -0,0 +1,244 @@
+'''
+'''
+
+from collections import deque
+import math
+
+from resampler import BarAggregator
+
+NAN = float('nan')
+
+
+def isnan(val):
+    return val != val
+
+
+def ratio(num, den):
+    # mimic the float semantics of pandas when dividing by zero
+    if isnan(num) or isnan(den):
+        return NAN
+    if den == 0:
+        if num == 0:
+            return NAN
+        return math.copysign(float('inf'), num) * math.copysign(1, den)
+    return num / den
+
+
+def nanmin(values):
+    values = [val for val in values if not isnan(val)]
+    if values:
+        return min(values)
+    return NAN
+
+
+def nanmax(values):
+    values = [val for val in values if not isnan(val)]
+    if values:
+        return max(values)
+    return NAN
+
+
+class RollingWindow(object):
+    """
+    Rolling mean and sample standard deviation of the last n values,
+    updated in O(1) with Welford's algorithm. Like pandas rolling
+    functions the result is NaN until n values have been seen or when
+    a NaN is in the window.
+    """
+    RESYNC = 1000
+
+    def __init__(self, n):
+        self.n = n
+        self.values = deque()
+        self.nans = 0
+        self.count = 0
+        self.avg = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def push(self, value):
+        if len(self.values) == self.n:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        self._add(value)
+        self.updates += 1
+        if self.updates % self.RESYNC == 0:
+            self._resync()
+
+    def _add(self, value):
+        if isnan(value):
+            self.nans += 1
+            return
+        self.count += 1
+        delta = value - self.avg
+        self.avg += delta / self.count
+        self.m2 += delta * (value - self.avg)
+
+    def _remove(self, value):
+        if isnan(value):
+            self.nans -= 1
+            return
+        self.count -= 1
+        if self.count == 0:
+            self.avg = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.avg
+        self.avg -= delta / self.count
+        self.m2 -= delta * (value - self.avg)
+
+    def _resync(self):
+        # get rid of the rounding errors accumulated by the add/remove
+        # operations
+        values = [val for val in self.values if not isnan(val)]
+        self.count = len(values)
+        if self.count == 0:
+            self.avg = 0.0
+            self.m2 = 0.0
+        else:
+            self.avg = math.fsum(values) / self.count
+            self.m2 = math.fsum((val - self.avg) ** 2 for val in values)
+
+    def ready(self):
+        return len(self.values) == self.n and self.nans == 0
+
+    def mean(self):
+        if self.ready():
+            return self.avg
+        return NAN
+
+    def std(self):
+        if self.ready() and self.n > 1:
+            return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+        return NAN
+
+
+class WilderAverage(object):
+    """
+    Same result as pandas ewm(com=period - 1, adjust=False).mean()
+    fed one value at a time.
+    """
+    def __init__(self, period):
+        self.alpha = 1.0 / period
+        self.weighted = NAN
+        self.old_wt = 1.0
+
+    def push(self, value):
+        if isnan(self.weighted):
+            self.weighted = value
+            self.old_wt = 1.0
+        else:
+            self.old_wt *= (1 - self.alpha)
+            if not isnan(value):
+                if self.weighted != value:
+                    self.weighted = ((self.old_wt * self.weighted +
+                                      self.alpha * value) /
+                                     (self.old_wt + self.alpha))
+                self.old_wt = 1.0
+        return self.weighted
+
+
+class StreamingMA(object):
+    def __init__(self, n):
+        self.window = RollingWindow(n)
+
+    def update(self, value):
+        self.window.push(value)
+        return self.window.mean()
+
+
+class StreamingBB(object):
+    def __init__(self, length=20, numsd=2):
+        self.numsd = numsd
+        self.window = RollingWindow(length)
+
+    def update(self, value):
+        self.window.push(value)
+        mean = self.window.mean()
+        std = self.window.std()
+        return {'BBM': mean,
+                'BBU': mean + std * self.numsd,
+                'BBL': mean - std * self.numsd,
+                'BBW': ratio(std * 2 * self.numsd, mean)}
+
+
+class StreamingRSI(object):
+    def __init__(self, period=14):
+        self.prev = NAN
+        self.up = WilderAverage(period)
+        self.down = WilderAverage(period)
+
+    def update(self, value):
+        delta = value - self.prev
+        self.prev = value
+        if isnan(delta):
+            r_up = self.up.push(NAN)
+            r_down = self.down.push(NAN)
+        else:
+            r_up = self.up.push(max(delta, 0.0))
+            r_down = self.down.push(min(delta, 0.0))
+        return 100 - ratio(100, 1 + ratio(r_up, abs(r_down)))
+
+
+class StreamingATR(object):
+    def __init__(self, n=20):
+        self.n = n
+        self.prev_close = NAN
+        self.window = RollingWindow(n)
+        self.prev_mean = NAN
+
+    def update(self, high, low, close):
+        true_range = nanmax([abs(high - low),
+                             abs(high - self.prev_close),
+                             abs(low - self.prev_close)])
+        self.prev_close = close
+        atr = ((self.n - 1) * self.prev_mean + true_range) / self.n
+        self.window.push(true_range)
+        self.prev_mean = self.window.mean()
+        return atr
+
+
+class StreamingATRStop(object):
+    def __init__(self, n=20):
+        self.atr = StreamingATR(n)
+        self.lows = deque([NAN] * 3, maxlen=3)
+
+    def update(self, high, low, close):
+        atr = self.atr.update(high, low, close)
+        stop = nanmin(self.lows) - atr / 3
+        self.lows.append(low)
+        return stop
+
+
+class IndicatorEngine(object):
+    """
+    Aggregate 1 minute candles into bars of period minutes and keep
+    the indicators used by the trading plans up to date one bar at a
+    time. last_row exposes the last closed bar with the same columns
+    that BB, MA, RSI and ATR_STP add to a resampled dataframe.
+    """
+    def __init__(self, period, length=20, numsd=2, rsi_period=14,
+                 atr_length=20):
+        self.bars = BarAggregator(period, 1)
+        self.bb = StreamingBB(length, numsd)
+        self.vma = StreamingMA(20)
+        self.rsi = StreamingRSI(rsi_period)
+        self.atr_stop = StreamingATRStop(atr_length)
+        self.last_row = None
+
+    def update(self, candle, ts=None):
+        for bar in self.bars.update(candle, ts):
+            self._close(bar)
+        return self.last_row
+
+    def _close(self, bar):
+        row = dict(bar)
+        row.update(self.bb.update(bar['C']))
+        row['VMA20'] = self.vma.update(bar['V'])
+        row['RSI'] = self.rsi.update(bar['C'])
+        row['ATR_STP'] = self.atr_stop.update(bar['H'], bar['L'], bar['C'])
+        self.last_row = row
+        return row
+
+
+# indicators.py ends here
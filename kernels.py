@@ -0,0 +1,118 @@
+'''
+'''
+
+import numpy as np
+
+NAN = float('nan')
+
+
+def as_array(values):
+    """
+    float64 view of a Series, list or array without copy when possible
+    """
+    return np.asarray(values, dtype=np.float64)
+
+
+def _output(out, size):
+    if out is None:
+        return np.empty(size, dtype=np.float64)
+    return out
+
+
+def rolling_mean(values, n, out=None):
+    """
+    Mean of the last n values, NaN for the first n - 1 values or when
+    a NaN is in the window (same as pandas rolling(n).mean()).
+    """
+    size = len(values)
+    out = _output(out, size)
+    out[:n - 1] = NAN
+    if size >= n:
+        count = size - n + 1
+        acc = out[n - 1:]
+        acc[:] = values[:count]
+        for k in range(1, n):
+            acc += values[k:k + count]
+        acc /= n
+    return out
+
+
+def rolling_mean_std(values, n, out_mean=None, out_std=None, ddof=1):
+    """
+    Rolling mean and standard deviation computed together with a two
+    pass algorithm on the window. Only one temporary array is
+    allocated.
+    """
+    size = len(values)
+    mean = rolling_mean(values, n, out_mean)
+    std = _output(out_std, size)
+    std[:n - 1] = NAN
+    if size >= n:
+        count = size - n + 1
+        acc = std[n - 1:]
+        acc[:] = 0
+        center = mean[n - 1:]
+        tmp = np.empty(count, dtype=np.float64)
+        for k in range(n):
+            np.subtract(values[k:k + count], center, out=tmp)
+            np.multiply(tmp, tmp, out=tmp)
+            acc += tmp
+        acc /= (n - ddof)
+        np.sqrt(acc, out=acc)
+    return mean, std
+
+
+def true_range(high, low, close, out=None):
+    size = len(high)
+    out = _output(out, size)
+    np.subtract(high, low, out=out)
+    np.abs(out, out=out)
+    if size > 1:
+        tmp = np.empty(size - 1, dtype=np.float64)
+        prev = close[:-1]
+        for values in (high, low):
+            np.subtract(values[1:], prev, out=tmp)
+            np.abs(tmp, out=tmp)
+            # fmax ignores the NaN like DataFrame.max(axis=1)
+            np.fmax(out[1:], tmp, out=out[1:])
+    return out
+
+
+def atr(high, low, close, n=20, out=None):
+    """
+    ATR as computed by utils.ATR: ((n - 1) * previous MA_n(TR) + TR) / n
+    """
+    size = len(high)
+    out = _output(out, size)
+    tr = true_range(high, low, close)
+    mean = rolling_mean(tr, n)
+    out[:1] = NAN
+    if size > 1:
+        np.multiply(mean[:-1], n - 1, out=out[1:])
+        out[1:] += tr[1:]
+        out[1:] /= n
+    return out
+
+
+def lowest_previous(values, k=3, out=None):
+    """
+    Minimum of the k previous values ignoring NaN
+    """
+    size = len(values)
+    out = _output(out, size)
+    out[:] = NAN
+    for shift in range(1, min(k, size - 1) + 1):
+        np.fmin(out[shift:], values[:-shift], out=out[shift:])
+    return out
+
+
+def atr_stop(high, low, close, n=20, out=None):
+    """
+    Lowest low of the 3 previous bars minus a third of the ATR
+    """
+    out = lowest_previous(low, 3, out)
+    out -= atr(high, low, close, n) / 3
+    return out
+
+
+# kernels.py ends here
@@ -0,0 +1,161 @@
+'''
+'''
+
+import asyncio
+import collections
+import threading
+import time
+
+from utils import candle_time
+
+# seconds during which the history of a pair is shared
+HISTORY_MAX_AGE = 60
+
+
+class MarketDataHub(object):
+    """
+    Poll each pair once for all the trading plans watching it and
+    publish the new candles to their feeds. The history fetched when
+    the plans start is also shared.
+    """
+    def __init__(self, exch, history_max_age=HISTORY_MAX_AGE):
+        self.exch = exch
+        self.history_max_age = history_max_age
+        self.feeds = {}
+        self.prev_ticks = {}
+        self.history = {}
+        self.lock = threading.Lock()
+        self.tick_calls = 0
+        self.candle_calls = 0
+        self.published = 0
+
+    def pairs(self):
+        return [pair for pair, feeds in self.feeds.items() if feeds]
+
+    def subscribe(self, pair, feed):
+        self.feeds.setdefault(pair, []).append(feed)
+
+    def unsubscribe(self, pair, feed):
+        if feed in self.feeds.get(pair, ()):
+            self.feeds[pair].remove(feed)
+
+    def get_ticks(self, pairs):
+        if hasattr(self.exch, 'get_ticks'):
+            self.tick_calls += 1
+            return self.exch.get_ticks(pairs)
+        self.tick_calls += len(pairs)
+        return dict((pair, self.exch.get_tick(pair)) for pair in pairs)
+
+    def get_candles(self, pair, duration, refresh=False):
+        key = (pair, duration)
+        with self.lock:
+            if (refresh or key not in self.history or
+               time.time() - self.history[key][0] > self.history_max_age):
+                self.candle_calls += 1
+                self.history[key] = (time.time(),
+                                     self.exch.get_candles(pair, duration))
+            # the callers append their ticks to the list
+            return list(self.history[key][1])
+
+    def publish(self, pair, tick):
+        if not tick or tick == self.prev_ticks.get(pair):
+            return False
+        self.prev_ticks[pair] = tick
+        self.published += 1
+        for feed in self.feeds.get(pair, ()):
+            feed.push(tick)
+        return True
+
+    def stats(self):
+        return {'pairs': len(self.feeds),
+                'tick_calls': self.tick_calls,
+                'candle_calls': self.candle_calls,
+                'published': self.published}
+
+
+class FeedExchange(object):
+    """
+    Exchange of one trading plan getting its candles from a hub. The
+    other calls go to the exchange of the hub.
+    """
+    def __init__(self, hub):
+        self.hub = hub
+        self.pending = collections.deque()
+        self.event = None
+
+    def __getattr__(self, name):
+        return getattr(self.hub.exch, name)
+
+    def subscribe(self, pair):
+        self.event = asyncio.Event()
+        self.hub.subscribe(pair, self)
+
+    def unsubscribe(self, pair):
+        self.hub.unsubscribe(pair, self)
+
+    def push(self, tick):
+        self.pending.append(tick)
+        if self.event:
+            self.event.set()
+
+    async def wait(self):
+        while not self.pending:
+            self.event.clear()
+            await self.event.wait()
+
+    def get_tick(self, pair):
+        if self.pending:
+            return self.pending.popleft()
+        return None
+
+    def get_candles(self, pair, duration):
+        return self.hub.get_candles(pair, duration)
+
+    def refresh_candles(self, pair, duration):
+        return self.hub.get_candles(pair, duration, True)
+
+
+class Backfill(object):
+    """
+    Detect the 1 minute candles missing between the ticks of a pair
+    and get them with one get_candles request, or refresh_candles when
+    the exchange shares a cached history.
+    """
+    def __init__(self, exch, period=60):
+        self.exch = exch
+        self.period = period
+        self.last_times = {}
+        self.gaps = 0
+        self.backfilled = 0
+        self.lost = 0
+
+    def start(self, pair, candles):
+        if len(candles) > 0:
+            self.last_times[pair] = candle_time(candles[-1])
+
+    def fill(self, pair, tick):
+        """
+        Candles to process for a new tick: the missing ones in order
+        followed by the tick.
+        """
+        ts = candle_time(tick)
+        last = self.last_times.get(pair)
+        if last is None or ts > last:
+            self.last_times[pair] = ts
+        if last is None or ts <= last + self.period:
+            return [tick]
+        self.gaps += 1
+        get_candles = getattr(self.exch, 'refresh_candles',
+                              self.exch.get_candles)
+        missing = [candle for candle in get_candles(pair, 'oneMin')
+                   if last < candle_time(candle) < ts]
+        self.backfilled += len(missing)
+        self.lost += (ts - last) // self.period - 1 - len(missing)
+        return missing + [tick]
+
+    def stats(self):
+        return {'gaps': self.gaps, 'backfilled': self.backfilled,
+                'lost': self.lost}
+
+
+# market_data.py ends here
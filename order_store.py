@@ -0,0 +1,74 @@
+'''
+'''
+
+import json
+import os
+import sqlite3
+import threading
+
+# local copy of the order history, empty to disable it
+ORDER_DB = os.getenv('TBOT_ORDER_DB', 'orders.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS orders (
+    uuid TEXT PRIMARY KEY,
+    market TEXT,
+    closed TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_market_closed ON orders (market, closed);
+CREATE INDEX IF NOT EXISTS orders_closed ON orders (closed);
+'''
+
+
+class OrderStore(object):
+    """
+    Closed orders of the account in SQLite, keyed by OrderUuid. The
+    store keeps growing with each sync and the history of a market is
+    read through its index, whatever the size of the account history.
+    """
+    def __init__(self, path=ORDER_DB):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.inserted = 0
+
+    def sync(self, history):
+        """
+        Insert the orders of a history that are not stored yet. A
+        history of all the markets interleaves them so every order is
+        looked up. Return the number of new orders.
+        """
+        rows = [(data['OrderUuid'],
+                 data.get('Exchange') or data.get('MarketName'),
+                 data.get('Closed') or data.get('TimeStamp'),
+                 json.dumps(data))
+                for data in history]
+        with self.lock:
+            before = self.db.total_changes
+            with self.db:
+                self.db.executemany(
+                    'INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?)', rows)
+            count = self.db.total_changes - before
+            self.inserted += count
+        return count
+
+    def history(self, pair=None):
+        """
+        Stored orders of a market, or of all of them, newest first.
+        """
+        with self.lock:
+            if pair:
+                rows = self.db.execute(
+                    'SELECT data FROM orders WHERE market = ? '
+                    'ORDER BY closed DESC', (pair,))
+            else:
+                rows = self.db.execute(
+                    'SELECT data FROM orders ORDER BY closed DESC')
+            return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+# order_store.py ends here
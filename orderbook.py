@@ -0,0 +1,159 @@
+'''
+'''
+
+from heapq import heapify
+from heapq import heappop
+from heapq import heappush
+import itertools
+import uuid
+
+
+class OrderBook(object):
+    """
+    Simulated orders of an account. Resting limit orders are kept in
+    price ordered heaps (best buy and best sell on top) and conditional
+    orders in heaps ordered by trigger price, so matching a candle only
+    looks at the orders that are filled or triggered: O(log n) per
+    order. Orders are stored as dicts with the fields of the Bittrex
+    API.
+    """
+    def __init__(self, percent_fee=0.0025):
+        self.percent_fee = percent_fee
+        self.open = {}
+        self.filled = []
+        self._buys = []
+        self._sells = []
+        # sell orders triggered when the price goes below the target
+        self._stops = []
+        # buy orders triggered when the price goes above the target
+        self._triggers = []
+        self._seq = itertools.count()
+        self._stale = 0
+
+    def add(self, pair, order_type, quantity, limit, condition='NONE',
+            target=None, now=None):
+        oid = str(uuid.uuid4())
+        data = {'OrderUuid': oid,
+                'Exchange': pair,
+                'OrderType': order_type,
+                'Quantity': quantity,
+                'QuantityRemaining': quantity,
+                'Limit': limit,
+                'IsConditional': condition != 'NONE',
+                'Condition': condition,
+                'ConditionTarget': target,
+                'PricePerUnit': None,
+                'Price': 0,
+                'Commission': 0,
+                'IsOpen': True,
+                'Opened': now,
+                'Closed': None}
+        self.open[oid] = data
+        seq = next(self._seq)
+        if condition == 'LESS_THAN':
+            heappush(self._stops, (-target, seq, oid))
+        elif condition == 'GREATER_THAN':
+            heappush(self._triggers, (target, seq, oid))
+        elif order_type == 'LIMIT_BUY':
+            heappush(self._buys, (-limit, seq, oid))
+        else:
+            heappush(self._sells, (limit, seq, oid))
+        return data
+
+    def get(self, oid):
+        if oid in self.open:
+            return self.open[oid]
+        for data in reversed(self.filled):
+            if data['OrderUuid'] == oid:
+                return data
+        return None
+
+    def open_orders(self, pair=None):
+        # newest first like the history
+        return [data for data in reversed(list(self.open.values()))
+                if pair is None or data['Exchange'] == pair]
+
+    def history(self, pair=None):
+        return [data for data in reversed(self.filled)
+                if pair is None or data['Exchange'] == pair]
+
+    def reserved(self, pair=None):
+        return sum(data['QuantityRemaining'] for data in self.open_orders(pair)
+                   if data['OrderType'] == 'LIMIT_SELL')
+
+    def cancel(self, oid, now=None):
+        data = self.open.pop(oid, None)
+        if data is None:
+            return None
+        data['IsOpen'] = False
+        data['Closed'] = now
+        # the heap entries are removed lazily
+        self._stale += 1
+        if self._stale > 64 and self._stale > len(self.open):
+            self._compact()
+        return data
+
+    def _compact(self):
+        for heap in (self._buys, self._sells, self._stops, self._triggers):
+            heap[:] = [entry for entry in heap if entry[2] in self.open]
+            heapify(heap)
+        self._stale = 0
+
+    def _pop(self, heap):
+        entry = heappop(heap)
+        if entry[2] in self.open:
+            return entry
+        self._stale -= 1
+        return None
+
+    def _fill(self, oid, price, now):
+        data = self.open.pop(oid)
+        quantity = data['Quantity']
+        data['QuantityRemaining'] = 0
+        data['PricePerUnit'] = price
+        data['Price'] = price * quantity
+        data['Commission'] = price * quantity * self.percent_fee
+        data['IsOpen'] = False
+        data['Closed'] = now
+        self.filled.append(data)
+        return data
+
+    def match(self, tick):
+        """
+        Fill the orders reached by a candle and return them in the order
+        they were filled.
+        """
+        low = tick['L']
+        high = tick['H']
+        middle = (high + low) / 2
+        now = tick['T']
+        fills = []
+        while self._stops and -self._stops[0][0] > low:
+            entry = self._pop(self._stops)
+            if entry:
+                fills.append(self._fill(entry[2], (-entry[0] + low) / 2, now))
+        while self._triggers and self._triggers[0][0] < high:
+            entry = self._pop(self._triggers)
+            if entry:
+                limit = self.open[entry[2]]['Limit']
+                if limit >= low:
+                    fills.append(self._fill(entry[2],
+                                            min(limit, max(entry[0], low)),
+                                            now))
+                else:
+                    # triggered, now a plain limit order
+                    heappush(self._buys, (-limit, entry[1], entry[2]))
+        while self._buys and -self._buys[0][0] >= low:
+            entry = self._pop(self._buys)
+            if entry:
+                fills.append(self._fill(entry[2], min(-entry[0], middle),
+                                        now))
+        while self._sells and self._sells[0][0] < high:
+            entry = self._pop(self._sells)
+            if entry:
+                fills.append(self._fill(entry[2], max(entry[0], middle),
+                                        now))
+        return fills
+
+
+# orderbook.py ends here
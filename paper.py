@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 from bittrex_exchange import BittrexExchange
+from candle_archive import archive_exchange
 from trade import main
+from trade import stream_exchange
 from replay import FakeExchange
 
 
@@ -10,14 +12,25 @@ class PaperExchange(FakeExchange):
         self.real_exch = real_exch
         super().__init__(100, 100, [])
 
+    def __getattr__(self, name):
+        # wait_tick of streams
+        if name == 'real_exch':
+            raise AttributeError(name)
+        return getattr(self.real_exch, name)
+
     def get_tick(self, pair):
-        return self.real_exch.get_tick(pair)
+        tick = self.real_exch.get_tick(pair)
+        # fill the simulated orders once per new candle
+        if tick and tick['T'] != self.now:
+            self.process_tick(tick)
+        return tick
 
     def get_candles(self, pair, duration):
         return self.real_exch.get_candles(pair, duration)
 
 
 if __name__ == "__main__":
-    main(PaperExchange(BittrexExchange(False)))
+    main(PaperExchange(
+        archive_exchange(stream_exchange(BittrexExchange(False)))))
 
 # paper.py ends here
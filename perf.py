@@ -23,17 +23,17 @@ for idx in range(len(orders)):
         break
 
 print(orders[idx])
-entry = orders[idx].quantity() * orders[idx].price_per_unit()
+entry = orders[idx].quantity * orders[idx].price_per_unit
 total = 0
 
 for i in range(idx):
     print(orders[i])
-    total += orders[i].quantity() * orders[i].price_per_unit()
+    total += orders[i].quantity * orders[i].price_per_unit
 
 print('delta=%s percent=%.2f%%' % (btc2str(total - entry),
                                  (total / entry - 1) * 100))
 
-price = orders[idx].price_per_unit() + (total - entry) / orders[idx].quantity()
+price = orders[idx].price_per_unit + (total - entry) / orders[idx].quantity
 
 print('equivalent to have sold at %s x %.3f' % (btc2str(price),
-                                                orders[idx].quantity()))
+                                                orders[idx].quantity))
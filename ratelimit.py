@@ -0,0 +1,127 @@
+'''
+'''
+
+import asyncio
+import fcntl
+import os
+import struct
+import threading
+import time
+
+# priority classes, most urgent first
+ORDER = 0
+READ = 1
+HISTORY = 2
+
+# part of the burst each class leaves to the more urgent ones
+RESERVES = (0, 0.3, 0.6)
+
+# tokens and time of the last refill, shared through the lock file
+STATE = struct.Struct('dd')
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at rate tokens per second up to burst. Each
+    request takes a token, but a priority class only takes one if its
+    reserve is still in the bucket afterwards: when tokens are scarce,
+    orders go ahead of the reads and the reads ahead of the history.
+    With a lock file, the bucket is shared by all the processes opening
+    the same file.
+    """
+    def __init__(self, rate, burst, lock_file=None, reserves=RESERVES,
+                 clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.reserves = [min(burst * reserve, burst - 1)
+                         for reserve in reserves]
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.fd = None
+        if lock_file:
+            self.fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+        self.tokens = burst
+        self.last = clock()
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0
+
+    def _refill(self):
+        if self.fd is not None:
+            data = os.pread(self.fd, STATE.size, 0)
+            if len(data) == STATE.size:
+                self.tokens, self.last = STATE.unpack(data)
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + max(now - self.last, 0) * self.rate)
+        self.last = now
+
+    def try_acquire(self, priority=READ):
+        """
+        Take a token and return 0, or return the seconds to wait before
+        one is available for the priority.
+        """
+        with self.lock:
+            if self.fd is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                self._refill()
+                needed = 1 + self.reserves[priority]
+                delay = 0
+                if self.tokens >= needed:
+                    self.tokens -= 1
+                else:
+                    delay = (needed - self.tokens) / self.rate
+                if self.fd is not None:
+                    os.pwrite(self.fd, STATE.pack(self.tokens, self.last), 0)
+                return delay
+            finally:
+                if self.fd is not None:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def acquire(self, priority=READ):
+        """
+        Block until a token is taken. Return the seconds waited.
+        """
+        waited = 0
+        delay = self.try_acquire(priority)
+        while delay:
+            self.sleep(delay)
+            waited += delay
+            delay = self.try_acquire(priority)
+        self.count(waited)
+        return waited
+
+    async def acquire_async(self, priority=READ):
+        """
+        Same as acquire without blocking the event loop.
+        """
+        waited = 0
+        delay = self.try_acquire(priority)
+        while delay:
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = self.try_acquire(priority)
+        self.count(waited)
+        return waited
+
+    def count(self, waited):
+        with self.lock:
+            self.requests += 1
+            if waited:
+                self.throttled += 1
+                self.waited += waited
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def stats(self):
+        return {'requests': self.requests,
+                'throttled': self.throttled,
+                'waited': self.waited}
+
+
+# ratelimit.py ends here
@@ -1,171 +1,167 @@
 #!/usr/bin/env python
 
+from calendar import timegm
+from concurrent.futures import Future
 from datetime import datetime
-import gzip
-import json
 import os
 import sys
 
+import numpy as np
+
 from bittrex_exchange import BittrexOrder
+from orderbook import OrderBook
 from trade import load_trading_plan_class
+from tradefile import CandleColumns
+from tradefile import load_trade
 from utils import btc2str
 
 
 class FakeExchange(object):
     def __init__(self, balance, available, candles):
         self.balance = balance
-        self.available = available
         self.candles = candles
-        self.order = None
-        self.orders = []
         self.percent_fee = 0.0025
+        self.book = OrderBook(self.percent_fee)
+        self.now = None
         self.logger = None
+        self.fills = []
 
     def log(self, msg):
         if self.logger:
             self.logger(msg)
 
     def get_position(self, pair):
-        return {'Balance': self.balance}
+        return {'Balance': self.balance,
+                'Available': self.balance - self.book.reserved(pair)}
 
     def get_open_orders(self, pair):
-        return [self.order]
+        return [BittrexOrder(data, id=data['OrderUuid'])
+                for data in self.book.open_orders(pair)]
+
+    def place(self, pair, order_type, quantity, limit, condition='NONE',
+              target=None):
+        data = self.book.add(pair, order_type, quantity, limit, condition,
+                             target, self.now)
+        return BittrexOrder(data, id=data['OrderUuid'])
 
     def sell_limit(self, pair, quantity, limit_price):
         self.log('SELL LMT %.3f %s %s' % (quantity, pair,
                                           btc2str(limit_price)))
-        self.order = BittrexOrder({'OrderId': '1',
-                                   'Quantity': quantity,
-                                   'Limit': limit_price,
-                                   'Commission':
-                                   limit_price * quantity * self.percent_fee,
-                                   'OrderType': 'LIMIT_SELL',
-                                   'IsConditional': False,
-                                   'Condition': 'NONE',
-                                   'Exchange': pair,
-                                   'PricePerUnit': limit_price},
-                                  id='1')
-        self.orders.insert(0, self.order)
-        return self.order
+        return self.place(pair, 'LIMIT_SELL', quantity, limit_price)
 
     def sell_stop(self, pair, quantity, stop_price):
         self.log('SELL STP %.3f %s %s' % (quantity, pair, btc2str(stop_price)))
-        self.order = BittrexOrder({'OrderId': '1',
-                                   'Quantity': quantity,
-                                   'Limit': stop_price / 2,
-                                   'Commission':
-                                   stop_price * quantity * self.percent_fee,
-                                   'OrderType': 'LIMIT_SELL',
-                                   'IsConditional': True,
-                                   'Condition': 'LESSTHAN',
-                                   'ConditionTarget': stop_price,
-                                   'Exchange': pair,
-                                   'PricePerUnit': stop_price},
-                                  id='2')
-        self.orders.insert(0, self.order)
-        return self.order
+        return self.place(pair, 'LIMIT_SELL', quantity, stop_price / 2,
+                          'LESS_THAN', stop_price)
 
     def buy_limit(self, pair, quantity, limit_price):
         self.log('BUY LMT %.3f %s %s' % (quantity, pair, btc2str(limit_price)))
-        self.order = BittrexOrder({'OrderId': '1',
-                                   'Quantity': quantity,
-                                   'Limit': limit_price,
-                                   'Commission':
-                                   limit_price * quantity * self.percent_fee,
-                                   'OrderType': 'LIMIT_BUY',
-                                   'IsConditional': False,
-                                   'Condition': 'NONE',
-                                   'Exchange': pair,
-                                   'PricePerUnit': limit_price},
-                                  id='3')
-        self.orders.insert(0, self.order)
-        return self.order
+        return self.place(pair, 'LIMIT_BUY', quantity, limit_price)
 
     def buy_limit_range(self, pair, quantity, entry, val_max):
         self.log('BUY RNG %.3f %s %s-%s' % (quantity, pair,
                                             btc2str(entry), btc2str(val_max)))
+        return self.place(pair, 'LIMIT_BUY', quantity, val_max,
+                          'GREATER_THAN', entry)
 
     def get_candles(self, pair, duration):
         return self.candles
 
     def get_order_history(self, pair=None):
-        return self.orders
+        return [BittrexOrder(data, id=data['OrderUuid'])
+                for data in self.book.history(pair)]
 
     def update_order(self, order):
+        data = self.book.get(order.id)
+        if data:
+            order.update(data)
         return order
 
     def cancel_order(self, order):
-        self.order = None
-        return self.order
+        data = self.book.cancel(order.id, self.now)
+        if data:
+            order.update(data)
+        return True
+
+    def submit_orders(self, orders):
+        # one at a time as the order book is not thread safe
+        results = []
+        for order in orders:
+            try:
+                results.append(getattr(self, order[0])(*order[1:]))
+            except Exception as error:
+                results.append(error)
+        return results
+
+    def cancel_order_async(self, order):
+        future = Future()
+        future.set_result(self.cancel_order(order))
+        return future
+
+    def fill(self, data):
+        order = BittrexOrder(data, id=data['OrderUuid'])
+        if order.is_buy_order():
+            self.balance += data['Quantity']
+            self.log('BOUGHT %s' % order)
+        else:
+            self.balance -= data['Quantity']
+            self.log('SOLD %s @ %s' % (order, btc2str(data['PricePerUnit'])))
+        self.fills.append((data['Closed'],
+                           'BUY' if order.is_buy_order() else 'SELL',
+                           str(order),
+                           data['Quantity'],
+                           data['PricePerUnit'],
+                           data['Commission']))
 
     def process_tick(self, tick):
-        if self.order:
-            self.log('ORDER %s' % self.order)
-            if self.order.is_buy_order() and self.order.limit() >= tick['L']:
-                self.log('BOUGHT')
-                self.order = None
-            elif self.order.is_sell_order():
-                if (not self.order.data['IsConditional'] and
-                   tick['H'] > self.order.limit()):
-                    self.log('SOLD LIMIT')
-                    self.order.data['PricePerUnit'] = (
-                        (tick['H'] + tick['L']) / 2)
-                    self.order = None
-                elif (self.order.data['IsConditional'] and
-                      self.order.data['ConditionTarget'] > tick['L']):
-                    self.order.data['PricePerUnit'] = (
-                        (self.order.data['ConditionTarget'] + tick['L']) / 2)
-                    self.log('STOPPED @ %s' %
-                             btc2str(self.order.data['PricePerUnit']))
-                    self.order = None
-
-
-def main():
-    if len(sys.argv) < 3:
-        print('Usage: %s <trading plan>|- <filename> [<args>]' % sys.argv[0])
-        sys.exit(1)
+        self.now = tick['T']
+        for data in self.book.match(tick):
+            self.fill(data)
 
-    with gzip.open(sys.argv[2], 'r') as fin:
-        json_bytes = fin.read()
-        json_str = json_bytes.decode('utf-8')
-        data = json.loads(json_str)
-
-    if sys.argv[1] == '-':
-        trading_plan_class = load_trading_plan_class(data['plan'])
-    else:
-        trading_plan_class = load_trading_plan_class(sys.argv[1])
 
+def start_index(candles):
     if os.getenv('TBOT_START_DATE'):
         dt = datetime.strptime(os.getenv('TBOT_START_DATE'),
                                '%Y-%m-%d %H:%M')
-        for idx in range(len(data['candles'])):
-            if datetime.strptime(data['candles'][idx]['T'],
+        if isinstance(candles, CandleColumns):
+            idx = int(np.searchsorted(candles.times, timegm(dt.timetuple())))
+            if idx < len(candles):
+                return idx
+            return 20
+        for idx in range(len(candles)):
+            if datetime.strptime(candles[idx]['T'],
                                  '%Y-%m-%dT%H:%M:%S') >= dt:
-                break
-        else:
-            idx = 20
+                return idx
+    return 20
+
+
+def create_plan(data, plan, args, idx):
+    if plan == '-':
+        trading_plan_class = load_trading_plan_class(data['plan'])
     else:
-        idx = 20
+        trading_plan_class = load_trading_plan_class(plan)
 
     exch = FakeExchange(data['balance'], data['available'],
-                        data['candles'][:idx])
+                        list(data['candles'][:idx]))
     print(data['plan'], data['args'])
-    if len(sys.argv) == 3:
+    if len(args) == 0:
         trading_plan = trading_plan_class(exch, data['plan'],
                                           data['args'], False)
     else:
-        if sys.argv[3] == '-b':
+        if args[0] == '-b':
             buy = True
-            args = sys.argv[4:]
+            args = args[1:]
         else:
             buy = False
-            args = sys.argv[3:]
         trading_plan = trading_plan_class(exch, data['plan'],
                                           args, buy)
     if os.getenv('TBOT_DEBUG_REPLAY'):
         exch.logger = trading_plan.log
+    return exch, trading_plan
+
 
-    for tick in data['candles'][idx:]:
+def replay(exch, trading_plan, candles):
+    for tick in candles:
         exch.candles.append(tick)
         exch.process_tick(tick)
         trading_plan.tick = tick
@@ -173,6 +169,17 @@ def main():
             break
 
 
+def main():
+    if len(sys.argv) < 3:
+        print('Usage: %s <trading plan>|- <filename> [<args>]' % sys.argv[0])
+        sys.exit(1)
+
+    data = load_trade(sys.argv[2])
+    idx = start_index(data['candles'])
+    exch, trading_plan = create_plan(data, sys.argv[1], sys.argv[3:], idx)
+    replay(exch, trading_plan, data['candles'][idx:])
+
+
 if __name__ == "__main__":
     main()
 
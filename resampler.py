@@ -0,0 +1,153 @@
+'''
+'''
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from candles import COLUMNS
+from utils import candle_time
+
+DAY = 86400
+NAN = float('nan')
+
+
+class BarAggregator(object):
+    """
+    Aggregate 1 minute candles into bars of period minutes one candle
+    at a time. The bins are the same as the ones of pandas resample:
+    anchored on the midnight of the day of the first candle, with
+    empty bars for the periods without candles. The last size closed
+    bars are kept in closed and the bar in progress in current.
+    """
+    def __init__(self, period, size=None, origin=None):
+        self.period = period * 60
+        self.origin = origin
+        self.closed = deque(maxlen=size)
+        self.current = None
+        self._frame = None
+
+    def update(self, candle, ts=None):
+        if ts is None:
+            ts = candle_time(candle)
+        if self.origin is None:
+            self.origin = ts - ts % DAY
+        start = ts - (ts - self.origin) % self.period
+        self._frame = None
+        bar = self.current
+        if bar is None:
+            self.current = self._open(start, candle)
+            return ()
+        if start == bar['T']:
+            if candle['H'] > bar['H']:
+                bar['H'] = candle['H']
+            if candle['L'] < bar['L']:
+                bar['L'] = candle['L']
+            bar['C'] = candle['C']
+            bar['V'] += candle['V']
+            bar['BV'] += candle['BV']
+            return ()
+        if start < bar['T']:
+            # late candle for an already closed bar
+            return ()
+        closed = [bar]
+        for empty in range(bar['T'] + self.period, start, self.period):
+            closed.append({'T': empty, 'O': NAN, 'H': NAN, 'L': NAN,
+                           'C': NAN, 'V': 0, 'BV': 0})
+        self.closed.extend(closed)
+        self.current = self._open(start, candle)
+        return closed
+
+    @staticmethod
+    def _open(start, candle):
+        return {'T': start, 'O': candle['O'], 'H': candle['H'],
+                'L': candle['L'], 'C': candle['C'], 'V': candle['V'],
+                'BV': candle['BV']}
+
+    def bars(self):
+        if self.current is None:
+            return list(self.closed)
+        return list(self.closed) + [self.current]
+
+    def to_dataframe(self):
+        if self._frame is None:
+            bars = self.bars()
+            index = pd.to_datetime([bar['T'] for bar in bars], unit='s')
+            index.name = 'T'
+            self._frame = pd.DataFrame(
+                dict((col, [bar[col] for bar in bars]) for col in COLUMNS),
+                index=index, columns=COLUMNS)
+        return self._frame
+
+
+class Resampler(object):
+    """
+    Keep a BarAggregator per period, all fed from the same 1 minute
+    candles.
+    """
+    def __init__(self, periods, size=None):
+        self.size = size
+        self.origin = None
+        self.aggregators = {}
+        for period in periods:
+            self.add_period(period)
+
+    def add_period(self, period):
+        if period not in self.aggregators:
+            self.aggregators[period] = BarAggregator(period, self.size,
+                                                     self.origin)
+        return self.aggregators[period]
+
+    def __contains__(self, period):
+        return period in self.aggregators
+
+    def __getitem__(self, period):
+        return self.aggregators[period]
+
+    def update(self, candle, ts=None):
+        if ts is None:
+            ts = candle_time(candle)
+        if self.origin is None:
+            self.origin = ts - ts % DAY
+        for aggregator in self.aggregators.values():
+            if aggregator.origin is None:
+                aggregator.origin = self.origin
+            aggregator.update(candle, ts)
+
+    def to_dataframe(self, period):
+        return self.aggregators[period].to_dataframe()
+
+
+def resample_arrays(times, values, period):
+    """
+    Vectorized version of BarAggregator over a whole series. times are
+    the sorted timestamps of the candles in seconds and values a dict
+    of their O, H, L, C, V and BV arrays. Returns the index of the bar
+    of each candle (the first bar being the one of the first candle)
+    and the dict of the bar arrays.
+    """
+    period = period * 60
+    origin = times[0] - times[0] % DAY
+    bucket = (times - origin) // period
+    bucket -= bucket[0]
+    size = int(bucket[-1]) + 1
+    starts = np.flatnonzero(np.concatenate(([True],
+                                            bucket[1:] != bucket[:-1])))
+    ends = np.concatenate((starts[1:], [len(times)])) - 1
+    ids = bucket[starts]
+    bars = {}
+    for col in ('O', 'H', 'L', 'C'):
+        bars[col] = np.full(size, NAN, dtype=np.float64)
+    for col in ('V', 'BV'):
+        bars[col] = np.zeros(size, dtype=np.float64)
+    bars['O'][ids] = values['O'][starts]
+    bars['H'][ids] = np.maximum.reduceat(values['H'], starts)
+    bars['L'][ids] = np.minimum.reduceat(values['L'], starts)
+    bars['C'][ids] = values['C'][ends]
+    bars['V'][ids] = np.add.reduceat(values['V'], starts)
+    bars['BV'][ids] = np.add.reduceat(values['BV'], starts)
+    return bucket, bars
+
+
+# resampler.py ends here
@@ -10,6 +10,10 @@ from utils import (btc2str, red, green)
 
 # Idea from https://tradingstrategyguides.com/ripple-trading-strategy/
 class RippleTradingPlan(TradingPlan):
+    checkpoint_fields = ('status', 'amount', 'entry', 'stop', 'cost',
+                         'quantity', 'midnight_price', 'target')
+    checkpoint_orders = ('stop_order',)
+
     def __init__(self, exch, name, arguments, buy):
         parser = argparse.ArgumentParser(prog=name)
         parser.add_argument('pair', help='pair of crypto like BTC-ETH')
@@ -25,18 +29,24 @@ class RippleTradingPlan(TradingPlan):
         self.stop_order = None
         self.cost = 0
         self.quantity = 0
+        # enough history to find the previous midnight
+        self.lookback = 24 * 60
 
         super().__init__(exch, name, arguments, buy)
 
         self.ticks = self.init_dataframes()
-        if buy:
-            last_row = self.df.iloc[-1]
+        if self.restore_checkpoint():
+            # status and midnight price restored
+            pass
+        elif buy:
+            df = self.df
+            last_row = df.iloc[-1]
             if last_row.name.hour > 10:
                 self.status = 'midnight'
             else:
                 idx = -2
                 while True:
-                    row = self.df.iloc[idx]
+                    row = df.iloc[idx]
                     if row.name.hour == 0 and row.name.minute == 0:
                         self.midnight_price = row['O']
                         self.log('Midnight price %s' %
@@ -130,9 +140,9 @@ class RippleTradingPlan(TradingPlan):
                 self.log('Unable to find buy order. Aborting.')
                 sys.exit(1)
             buy_order = past_orders[0]
-            self.entry = buy_order.data['PricePerUnit']
-            self.quantity = buy_order.data['Quantity']
-            self.cost = buy_order.data.get('Commission', 0)
+            self.entry = buy_order.price_per_unit
+            self.quantity = buy_order.quantity
+            self.cost = buy_order.commission
             self.log("bought %f @ %s Fees %s" %
                      (self.quantity, btc2str(self.entry),
                       btc2str(self.cost)))
@@ -152,9 +162,9 @@ class RippleTradingPlan(TradingPlan):
             self.compute_gains(past_orders[0])
 
     def compute_gains(self, order):
-        price = order.data['PricePerUnit']
-        quantity = order.data['Quantity']
-        self.cost += order.data['Commission']
+        price = order.price_per_unit
+        quantity = order.quantity
+        self.cost += order.commission
         amount = price * quantity - self.cost
         self.log('sold %f @ %s => %f %f %.2f%%' %
                  (quantity, btc2str(price),
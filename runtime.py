@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+'''
+Run several trading plans in one process. Each plan is an asyncio
+task: the calls to the exchange are done concurrently in a pool of
+threads and the processing of the ticks in another pool so the event
+loop is never blocked by one plan. A failing plan is stopped and its
+trade saved without affecting the other plans.
+
+With a MarketDataHub, each pair is polled once and its new candles are
+delivered to all the plans watching it.
+'''
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shlex
+import sys
+import traceback
+
+from bittrex_exchange import BittrexExchange
+from cached_exchange import CachedExchange
+from candle_archive import archive_exchange
+from market_data import Backfill
+from market_data import FeedExchange
+from market_data import MarketDataHub
+from paper import PaperExchange
+from scheduler import PollScheduler
+from scheduler import near_trigger
+from trade import create_trading_plan
+from trade import print_backfill_stats
+from trade import print_http_stats
+from trade import print_order_stats
+from trade import process_candle
+from trade import save_trade
+from trading_plan import CHECKPOINT_DIR
+from trading_plan import TradingPlan
+
+# seconds between two polls of a pair
+POLL_INTERVAL = 30
+
+
+class PlanTask(object):
+    def __init__(self, exch, argv, feed=None):
+        self.exch = exch
+        self.argv = argv
+        # FeedExchange delivering the candles when a hub is used
+        self.feed = feed
+        self.trading_plan = None
+        self.ticks = []
+        self.backfill = Backfill(exch)
+        self.error = None
+
+    def log(self, msg):
+        if self.trading_plan:
+            self.trading_plan.log(msg)
+        else:
+            print('%s %s' % (' '.join(self.argv), msg))
+
+    def save(self):
+        if self.trading_plan and len(self.ticks) > 0:
+            # several plans can trade the same pair
+            prefix = '%s-%s-%s' % (self.trading_plan.pair,
+                                   self.trading_plan.name,
+                                   self.ticks[0]['T'])
+            filename = prefix + '.trade'
+            idx = 1
+            while os.path.exists(filename):
+                idx += 1
+                filename = '%s-%d.trade' % (prefix, idx)
+            save_trade(self.trading_plan, self.ticks, filename)
+
+
+class Runtime(object):
+    def __init__(self, interval=POLL_INTERVAL, io_workers=None,
+                 cpu_workers=None, hub=None, scheduler=None):
+        self.interval = interval
+        self.hub = hub
+        self.scheduler = scheduler
+        self.io_executor = ThreadPoolExecutor(io_workers)
+        self.cpu_executor = ThreadPoolExecutor(cpu_workers)
+        self.tasks = []
+
+    async def io(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, func, *args)
+
+    async def cpu(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.cpu_executor, func, *args)
+
+    async def start_plan(self, task):
+        task.trading_plan = await self.cpu(create_trading_plan, task.exch,
+                                           task.argv)
+        task.ticks = await self.io(task.exch.get_candles,
+                                   task.trading_plan.pair, 'oneMin')
+        task.backfill.start(task.trading_plan.pair, task.ticks)
+        if task.feed:
+            task.feed.subscribe(task.trading_plan.pair)
+
+    async def wait_tick(self, task):
+        if task.feed:
+            await task.feed.wait()
+        else:
+            await asyncio.sleep(self.interval)
+
+    async def main_loop(self, task):
+        trading_plan = task.trading_plan
+        prev_tick = None
+        while True:
+            tick = await self.io(task.exch.get_tick, trading_plan.pair)
+            if tick and tick != prev_tick:
+                prev_tick = tick
+                candles = await self.io(task.backfill.fill,
+                                        trading_plan.pair, tick)
+                for candle in candles:
+                    if not await self.cpu(process_candle, task.exch,
+                                          trading_plan.pair, trading_plan,
+                                          task.ticks, candle):
+                        return
+            await self.wait_tick(task)
+
+    async def run_plan(self, task):
+        try:
+            await self.start_plan(task)
+            await self.main_loop(task)
+            task.log('Trading plan finished')
+        except asyncio.CancelledError:
+            task.log('Interrupted')
+            raise
+        except BaseException:
+            # includes the SystemExit of the plans aborting
+            task.error = traceback.format_exc()
+            task.log('Trading plan stopped:\n%s' % task.error)
+        finally:
+            if task.feed and task.trading_plan:
+                task.feed.unsubscribe(task.trading_plan.pair)
+            task.save()
+
+    async def poll(self):
+        pairs = self.hub.pairs()
+        if not pairs:
+            return
+        try:
+            ticks = await self.io(self.hub.get_ticks, pairs)
+        except Exception as error:
+            print('Unable to get ticks: %r' % error)
+            return
+        for pair in pairs:
+            if self.scheduler:
+                self.scheduler.record(pair, ticks.get(pair))
+            self.hub.publish(pair, ticks.get(pair))
+
+    def near_trigger(self, pair):
+        for task in self.tasks:
+            trading_plan = task.trading_plan
+            if (trading_plan and trading_plan.pair == pair and
+               trading_plan.tick and
+               near_trigger(trading_plan.tick['C'],
+                            trading_plan.trigger_levels())):
+                return True
+        return False
+
+    def poll_delay(self):
+        pairs = self.hub.pairs()
+        if not self.scheduler or not pairs:
+            return self.interval
+        return min(self.scheduler.next_delay(pair, self.near_trigger(pair))
+                   for pair in pairs)
+
+    async def poll_loop(self):
+        while True:
+            await self.poll()
+            await asyncio.sleep(self.poll_delay())
+
+    async def run(self, tasks):
+        self.tasks = tasks
+        poller = None
+        if self.hub:
+            poller = asyncio.ensure_future(self.poll_loop())
+        try:
+            await asyncio.gather(*[self.run_plan(task) for task in tasks])
+        finally:
+            if poller:
+                poller.cancel()
+
+    def shutdown(self):
+        self.io_executor.shutdown(wait=False)
+        self.cpu_executor.shutdown(wait=False)
+
+
+def read_plans(filename):
+    """
+    Read a file of trading plans, one per line with the arguments of
+    trade.py. Empty lines and lines starting with # are ignored.
+    """
+    if filename == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(filename) as fin:
+            lines = fin.readlines()
+    plans = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            plans.append(shlex.split(line))
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run several trading plans in one process.')
+    parser.add_argument('-p', '--paper', action='store_true',
+                        help='paper trading instead of live trading')
+    parser.add_argument('-i', '--interval', type=float,
+                        default=POLL_INTERVAL,
+                        help='maximum number of seconds between two polls '
+                        'of the exchange')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of threads processing the ticks')
+    parser.add_argument('plans', help='file with one trading plan per line '
+                        'like: <trading plan> [-b] <pair> [<args>]')
+    args = parser.parse_args()
+
+    plans = read_plans(args.plans)
+    if len(plans) == 0:
+        print('No trading plan in %s' % args.plans)
+        sys.exit(1)
+    # one poll per pair whatever the number of plans
+    hub = MarketDataHub(archive_exchange(BittrexExchange(not args.paper)))
+    tasks = []
+    for argv in plans:
+        feed = FeedExchange(hub)
+        if args.paper:
+            tasks.append(PlanTask(PaperExchange(feed), argv, feed))
+        else:
+            TradingPlan.checkpoint_dir = CHECKPOINT_DIR
+            tasks.append(PlanTask(CachedExchange(feed), argv, feed))
+
+    runtime = Runtime(args.interval, cpu_workers=args.jobs, hub=hub,
+                      scheduler=PollScheduler(max_delay=args.interval))
+    try:
+        asyncio.run(runtime.run(tasks))
+    except KeyboardInterrupt:
+        print('\nInterrupted by user')
+    finally:
+        runtime.shutdown()
+    print_order_stats()
+    print_http_stats()
+    backfills = [task.backfill.stats() for task in tasks]
+    print_backfill_stats(dict((key, sum(stats[key] for stats in backfills))
+                              for key in backfills[0]))
+    print('Market data: %(pairs)d pairs %(tick_calls)d tick calls '
+          '%(candle_calls)d candle calls %(published)d candles' % hub.stats())
+    errors = [task for task in tasks if task.error]
+    if errors:
+        print('%d trading plan(s) stopped on error' % len(errors))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# runtime.py ends here
@@ -0,0 +1,118 @@
+'''
+'''
+
+import collections
+import time
+
+from utils import candle_time
+
+# seconds between the start of two candles
+CANDLE_PERIOD = 60
+# relative distance to a trigger price under which we poll faster
+NEAR_TRIGGER = 0.005
+
+
+def near_trigger(price, levels, threshold=NEAR_TRIGGER):
+    return any(level and abs(level - price) <= price * threshold
+               for level in levels)
+
+
+class PollScheduler(object):
+    """
+    Decide when to poll the candles of a pair: just after the expected
+    publication of the next candle, which is its close plus the lag
+    measured on the previous candles of the pair. While the expected
+    candle does not show up, the delay grows exponentially up to
+    max_delay. It is never more than near_delay while a price is close
+    to a trigger.
+    """
+    def __init__(self, period=CANDLE_PERIOD, min_delay=2, max_delay=30,
+                 near_delay=5, margin=1, samples=10, clock=time.time):
+        self.period = period
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.near_delay = near_delay
+        self.margin = margin
+        self.clock = clock
+        self.samples = samples
+        self.lags = {}
+        self.last_times = {}
+        self.unchanged = {}
+        self.misses = {}
+        self.polls = 0
+        self.new_candles = 0
+
+    def record(self, pair, tick, now=None):
+        """
+        Record the result of a poll. Return True for a new candle.
+        """
+        if now is None:
+            now = self.clock()
+        self.polls += 1
+        ts = candle_time(tick) if tick else None
+        if ts is None or ts == self.last_times.get(pair):
+            self.misses[pair] = now
+            # only count the polls missing the expected candle
+            if now >= self.expected(pair):
+                self.unchanged[pair] = self.unchanged.get(pair, 0) + 1
+            return False
+        first = pair not in self.last_times
+        self.last_times[pair] = ts
+        self.unchanged[pair] = 0
+        self.new_candles += 1
+        close = ts + self.period
+        miss = self.misses.pop(pair, None)
+        if not first:
+            if miss is not None and miss > close:
+                # published between the two last polls
+                lag = (miss + now) / 2 - close
+            else:
+                # published before the poll: try earlier next time
+                lag = now - close - self.margin
+            lags = self.lags.setdefault(
+                pair, collections.deque(maxlen=self.samples))
+            lags.append(lag)
+        return True
+
+    def lag(self, pair):
+        lags = self.lags.get(pair)
+        if not lags:
+            return 0
+        return sum(lags) / len(lags)
+
+    def expected(self, pair):
+        """
+        Time at which the next candle of the pair should be visible.
+        """
+        if pair not in self.last_times:
+            return 0
+        return (self.last_times[pair] + 2 * self.period + self.lag(pair) +
+                self.margin)
+
+    def next_delay(self, pair, near=False, now=None):
+        """
+        Seconds to wait before the next poll of the pair.
+        """
+        if now is None:
+            now = self.clock()
+        if pair not in self.last_times:
+            delay = self.min_delay
+        else:
+            expected = self.expected(pair)
+            if expected > now:
+                delay = max(self.min_delay, expected - now)
+            else:
+                # late candle or unchanged market
+                delay = min(self.min_delay * 2 ** self.unchanged.get(pair, 0),
+                            self.max_delay)
+        if near:
+            delay = min(delay, self.near_delay)
+        return delay
+
+    def stats(self):
+        return {'polls': self.polls,
+                'new_candles': self.new_candles,
+                'lags': dict((pair, self.lag(pair)) for pair in self.lags)}
+
+
+# scheduler.py ends here
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+'''
+Streaming market data over a websocket. After connecting, the client
+sends {"subscribe": [<pairs>]} and the server pushes JSON messages:
+
+- trades: {"pair": "BTC-ETH", "T": "2018-01-03T07:18:12",
+  "price": 0.1, "quantity": 2.5, "base": 0.25}
+- time: {"T": "2018-01-03T07:19:00"}, meaning that all the trades
+  before T have been sent.
+
+The 1 minute candles are built locally. After a reconnection, the
+candles missed while disconnected are fetched with get_candles.
+
+Set TBOT_STREAM to the URL of the server to use it with trade.py and
+paper.py. Without a real feed, the server below replays the candles of
+a trade file::
+
+  ./stream.py -p 8765 BTC-ETH.trade
+  TBOT_STREAM=ws://localhost:8765 ./paper.py trailing_tp BTC-ETH ...
+'''
+
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import threading
+
+import websockets
+
+from tradefile import load_trade
+from tradefile import time2str
+from utils import candle_time
+
+# seconds between two connection attempts
+MAX_RECONNECT_DELAY = 30
+
+
+class CandleBuilder(object):
+    """
+    Build the 1 minute candles of a pair from its trades.
+    """
+    def __init__(self):
+        self.current = None
+        self.start = None
+        self.closed = collections.deque()
+        self.last_start = None
+
+    def trade(self, ts, price, quantity, base):
+        start = ts // 60 * 60
+        if self.last_start is not None and start <= self.last_start:
+            # late trade
+            return
+        if self.current and start > self.start:
+            self.close()
+        if self.current is None:
+            self.start = start
+            self.current = {'T': time2str(start), 'O': price, 'H': price,
+                            'L': price, 'C': price, 'V': quantity,
+                            'BV': base}
+        else:
+            self.current['H'] = max(self.current['H'], price)
+            self.current['L'] = min(self.current['L'], price)
+            self.current['C'] = price
+            self.current['V'] += quantity
+            self.current['BV'] += base
+
+    def advance(self, ts):
+        if self.current and self.start + 60 <= ts:
+            self.close()
+
+    def close(self):
+        self.closed.append(self.current)
+        self.last_start = self.start
+        self.current = None
+
+    def backfill(self, candles, before):
+        """
+        Add the candles missed before the start of the minute before.
+        The candle being built when disconnected is replaced.
+        """
+        self.current = None
+        if self.last_start is None:
+            # nothing received yet so nothing missed
+            return 0
+        count = 0
+        for candle in candles:
+            start = candle_time(candle)
+            if start > self.last_start and start + 60 <= before:
+                self.closed.append(dict(candle))
+                self.last_start = start
+                count += 1
+        return count
+
+
+class StreamExchange(object):
+    """
+    Exchange getting its ticks from a stream. get_tick returns the
+    next closed candle of the pair, or None, and wait_tick blocks until
+    one is available. The other calls go to the underlying exchange.
+    """
+    def __init__(self, exch, url):
+        self.exch = exch
+        self.url = url
+        self.builders = {}
+        self.cond = threading.Condition()
+        self.loop = None
+        self.websocket = None
+        self.thread = None
+        self.stopped = False
+        self.connects = 0
+        self.backfilled = 0
+        self.resync = False
+
+    def __getattr__(self, name):
+        if name == 'exch':
+            raise AttributeError(name)
+        return getattr(self.exch, name)
+
+    def subscribe(self, pair):
+        with self.cond:
+            if pair in self.builders:
+                return
+            self.builders[pair] = CandleBuilder()
+        if self.thread is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_until_complete,
+                                           args=(self.run(),), daemon=True)
+            self.thread.start()
+        elif self.websocket:
+            asyncio.run_coroutine_threadsafe(self.send_subscribe(),
+                                             self.loop)
+
+    def get_tick(self, pair):
+        self.subscribe(pair)
+        with self.cond:
+            closed = self.builders[pair].closed
+            if closed:
+                return closed.popleft()
+        return None
+
+    def wait_tick(self, pair, timeout=None):
+        self.subscribe(pair)
+        with self.cond:
+            return self.cond.wait_for(lambda: self.builders[pair].closed,
+                                      timeout)
+
+    def close(self):
+        self.stopped = True
+        if self.loop and self.websocket:
+            asyncio.run_coroutine_threadsafe(self.websocket.close(),
+                                             self.loop)
+        if self.thread:
+            self.thread.join(5)
+
+    async def send_subscribe(self):
+        with self.cond:
+            pairs = list(self.builders)
+        await self.websocket.send(json.dumps({'subscribe': pairs}))
+
+    async def run(self):
+        delay = 1
+        while not self.stopped:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    self.websocket = websocket
+                    self.connects += 1
+                    delay = 1
+                    await self.send_subscribe()
+                    async for message in websocket:
+                        await self.process(json.loads(message))
+            except (OSError, websockets.exceptions.WebSocketException) as err:
+                print('Stream %s: %r' % (self.url, err))
+            finally:
+                self.websocket = None
+            if self.stopped:
+                break
+            # the candles missed are fetched on the next message
+            self.resync = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def process(self, message):
+        ts = candle_time(message)
+        if self.resync:
+            self.resync = False
+            await self.backfill(ts // 60 * 60)
+        with self.cond:
+            if 'pair' in message:
+                builder = self.builders.get(message['pair'])
+                if builder:
+                    builder.trade(ts, message['price'], message['quantity'],
+                                  message['base'])
+            else:
+                for builder in self.builders.values():
+                    builder.advance(ts)
+            self.cond.notify_all()
+
+    async def backfill(self, before):
+        loop = asyncio.get_running_loop()
+        for pair in list(self.builders):
+            candles = await loop.run_in_executor(None, self.exch.get_candles,
+                                                 pair, 'oneMin')
+            with self.cond:
+                self.backfilled += self.builders[pair].backfill(candles,
+                                                                before)
+
+
+def candle_messages(pair, candle):
+    """
+    Trades reproducing a candle followed by the time message closing
+    it.
+    """
+    start = candle_time(candle)
+    messages = []
+    for offset, col in enumerate(('O', 'H', 'L', 'C')):
+        first = (offset == 0)
+        messages.append({'pair': pair,
+                         'T': time2str(start + offset * 15),
+                         'price': candle[col],
+                         'quantity': candle['V'] if first else 0,
+                         'base': candle['BV'] if first else 0})
+    messages.append({'T': time2str(start + 60)})
+    return messages
+
+
+class ReplayServer(object):
+    """
+    Serve the candles of a trade file. delay is the number of seconds
+    between two candles. For tests, connections can be dropped after
+    drop_after candles and skip candles are lost at each reconnection.
+    """
+    def __init__(self, pair, candles, delay=0, drop_after=None, skip=0):
+        self.pair = pair
+        self.candles = candles
+        self.delay = delay
+        self.drop_after = drop_after
+        self.skip = skip
+        self.pos = 0
+        self.connections = 0
+
+    async def handler(self, websocket, *args):
+        request = json.loads(await websocket.recv())
+        if self.pair not in request.get('subscribe', ()):
+            return
+        self.connections += 1
+        if self.connections > 1:
+            self.pos += self.skip
+        sent = 0
+        while self.pos < len(self.candles):
+            for message in candle_messages(self.pair,
+                                           self.candles[self.pos]):
+                await websocket.send(json.dumps(message))
+            self.pos += 1
+            sent += 1
+            if self.drop_after and sent >= self.drop_after:
+                return
+            await asyncio.sleep(self.delay)
+        # end of the trade file: keep the connection open
+        await websocket.wait_closed()
+
+    async def serve(self, host, port, started=None):
+        async with websockets.serve(self.handler, host, port) as server:
+            if started:
+                started(server)
+            await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Stream the candles of a trade file.')
+    parser.add_argument('-H', '--host', default='localhost')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('-d', '--delay', type=float, default=1,
+                        help='seconds between two candles')
+    parser.add_argument('filename', help='trade file')
+    args = parser.parse_args()
+
+    data = load_trade(args.filename)
+    server = ReplayServer(data['pair'], data['candles'], args.delay)
+    print('Streaming %d candles of %s on ws://%s:%d' %
+          (len(data['candles']), data['pair'], args.host, args.port))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
+
+# stream.py ends here
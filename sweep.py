@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+'''
+'''
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import shlex
+import string
+import sys
+
+from backtest import backtest
+from backtest import compute_rows
+from replay import create_plan
+from replay import load_trade
+from replay import replay
+from replay import start_index
+from trade import load_trading_plan_class
+
+# arguments of the trading plans built from the parameters of the grid
+TEMPLATES = {
+    'auto_bb_tp': '-b -p {percent} {pair} {amount} {period}',
+    'auto_bbrsi_tp': '-b -p {percent} {pair} {amount} {period}',
+    'trailing_tp': '-r {range} -p {period} {pair} {quantity} {stop} '
+    '{entry} {target}',
+}
+
+DEFAULTS = {
+    'auto_bb_tp': {'percent': '0.05', 'amount': '1'},
+    'auto_bbrsi_tp': {'percent': '0.05', 'amount': '1'},
+    'trailing_tp': {'range': '0.09', 'period': '60'},
+}
+
+# per worker caches
+_trades = {}
+_rows = {}
+
+
+def init_worker():
+    os.environ['TBOT_NO_LOG'] = '1'
+    sys.stdout = open(os.devnull, 'w')
+
+
+def get_trade(filename):
+    # decode each trade file only once per worker
+    if filename not in _trades:
+        _trades[filename] = load_trade(filename)
+    return _trades[filename]
+
+
+def compute_metrics(exch, trading_plan, amount, balance):
+    """
+    Final amount, number of trades and max drawdown (in percent) of
+    the equity. The equity is only sampled at each fill, so a drawdown
+    of an open position that recovers before its exit is not counted.
+    """
+    cash = amount
+    position = balance
+    peak = None
+    drawdown = 0
+    trades = 0
+    price = None
+    for fill in exch.fills:
+        quantity, price, fees = fill[3], fill[4], fill[5]
+        if fill[1] == 'BUY':
+            cash -= quantity * price + fees
+            position += quantity
+        else:
+            cash += quantity * price - fees
+            position -= quantity
+            trades += 1
+        equity = cash + position * price
+        if peak is None or equity > peak:
+            peak = equity
+        elif peak > 0:
+            drawdown = max(drawdown, (peak - equity) / peak * 100)
+    if hasattr(trading_plan, 'amount'):
+        final = trading_plan.amount
+    else:
+        last = exch.candles[-1]['C'] if exch.candles else price or 0
+        final = cash + position * last
+    return final, trades, drawdown
+
+
+def run_one(task):
+    plan, template, filename, params = task
+    args = []
+    try:
+        data = get_trade(filename)
+        params = dict(params, pair=data['pair'])
+        args = shlex.split(template.format(**params))
+        candles = data['candles']
+        idx = start_index(candles)
+        exch, trading_plan = create_plan(data, plan, args, idx)
+        amount = getattr(trading_plan, 'amount', 0)
+        balance = exch.balance
+        if hasattr(trading_plan, 'process_row'):
+            key = (filename, trading_plan.period)
+            if key not in _rows:
+                _rows[key] = compute_rows(candles, trading_plan.period)
+            backtest(exch, trading_plan, candles, idx, _rows[key])
+        else:
+            # the tick by tick replay modifies the candles
+            replay(exch, trading_plan,
+                   [dict(candle) for candle in candles[idx:]])
+        final, trades, drawdown = compute_metrics(exch, trading_plan,
+                                                  amount, balance)
+        return filename, args, final, trades, drawdown, None
+    except (Exception, SystemExit) as error:
+        return filename, args, None, 0, 0, repr(error)
+
+
+def parse_grid(specs):
+    grid = []
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if not values:
+            raise ValueError('invalid grid parameter %s' % spec)
+        grid.append((name, values.split(',')))
+    return grid
+
+
+def missing_params(plan, template, grid):
+    """
+    Placeholders of the template without a default or grid value.
+    """
+    names = set(name for _, name, _, _ in string.Formatter().parse(template)
+                if name)
+    known = set(DEFAULTS.get(plan, {})) | set(name for name, _ in grid)
+    known.add('pair')
+    return sorted(names - known)
+
+
+def sweep(plan, template, files, grid, processes=None):
+    """
+    Run a trading plan on all the files for each combination of the
+    grid. Return the results sorted from the best final amount.
+    """
+    names = [name for name, _ in grid]
+    combinations = [dict(DEFAULTS.get(plan, {}), **dict(zip(names, c)))
+                    for c in itertools.product(*[v for _, v in grid])]
+    tasks = [(plan, template, filename, params)
+             for filename in files
+             for params in combinations]
+
+    pool = multiprocessing.Pool(processes, init_worker)
+    try:
+        results = list(pool.imap_unordered(run_one, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+    results.sort(key=lambda res: (res[2] is None, -(res[2] or 0)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Backtest a trading plan on trade files for all the '
+        'combinations of a parameter grid, using all the cores.')
+    parser.add_argument('-g', '--grid', action='append', default=[],
+                        help='parameter values like period=15,30,60. '
+                        'Can be repeated.')
+    parser.add_argument('-a', '--args',
+                        help='arguments of the trading plan with {name} '
+                        'placeholders for the grid parameters and {pair}')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes. Default to the '
+                        'number of cores.')
+    parser.add_argument('plan', help='trading plan')
+    parser.add_argument('files', nargs='+', help='trade files')
+    args = parser.parse_args()
+
+    template = args.args or TEMPLATES.get(args.plan)
+    if not template:
+        print('No default arguments for %s, use --args' % args.plan)
+        sys.exit(1)
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as error:
+        parser.error(str(error))
+    missing = missing_params(args.plan, template, grid)
+    if missing:
+        parser.error('no value for %s, use -g' % ', '.join(missing))
+    load_trading_plan_class(args.plan)
+    results = sweep(args.plan, template, args.files, grid, args.jobs)
+
+    print('%4s %12s %6s %8s  %s' % ('rank', 'final', 'trades', 'max dd',
+                                    'file args'))
+    for rank, res in enumerate(results, 1):
+        filename, plan_args, final, trades, drawdown, error = res
+        if error:
+            print('%4d %12s %6s %8s  %s %s: %s' %
+                  (rank, '-', '-', '-', filename, ' '.join(plan_args), error))
+        else:
+            print('%4d %12.6f %6d %7.2f%%  %s %s' %
+                  (rank, final, trades, drawdown, filename,
+                   ' '.join(plan_args)))
+
+
+if __name__ == "__main__":
+    main()
+
+# sweep.py ends here
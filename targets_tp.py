@@ -7,8 +7,14 @@ from trading_plan import TradingPlan
 from utils import btc2str
 from utils import str2btc
 
+# ticks during which the target orders refused are placed again
+MAX_ORDER_ATTEMPTS = 5
+
 
 class TargetsTradingPlan(TradingPlan):
+    checkpoint_fields = ('status', 'stop_price', 'entry_price', 'targets',
+                         'quantity', 'pending_orders', 'order_attempts')
+
     def __init__(self, exch, name, args, buy):
         if len(args) < 4:
             print('Usage: %s [-b] <pair> ALL|<quantity> '
@@ -25,6 +31,8 @@ class TargetsTradingPlan(TradingPlan):
         stops = [self.stop_price, self.entry_price] + \
                 [abs(arg) for arg in self.targets]
         self.targets = [arg if arg > 0 else None for arg in self.targets]
+        self.pending_orders = []
+        self.order_attempts = 0
         self.stop_entry = {}
         for idx in range(len(stops) - 1):
             self.stop_entry[stops[idx + 1]] = stops[idx]
@@ -48,17 +56,33 @@ class TargetsTradingPlan(TradingPlan):
                                      ' '.join([btc2str(t) if t else 'reached'
                                                for t in self.targets])))
 
-        if self.buy:
+        if self.restore_checkpoint():
+            # the orders in place are the ones of the status
+            pass
+        elif self.buy:
             self.status = 'buying'
             if not self.do_buy_order(self.stop_price, self.entry_price):
                 sys.exit(1)
         else:
             self.status = 'unknown'
-            for order in self.update_open_orders():
-                self.log('Canceling %s' % order)
-                self.exch.cancel_order(order)
+            self.cancel_orders(self.update_open_orders())
             self.order = None
 
+    def place_pending_orders(self):
+        '''
+        Place the target orders not placed yet. Return False when they
+        are still refused after MAX_ORDER_ATTEMPTS ticks.
+        '''
+        self.order_attempts += 1
+        failed = self.send_orders(self.pending_orders)
+        self.pending_orders = [order for order, _ in failed]
+        if (self.pending_orders and
+           self.order_attempts >= MAX_ORDER_ATTEMPTS):
+            self.log('Unable to place %d target orders. Giving up.' %
+                     len(self.pending_orders))
+            return False
+        return True
+
     def process_tick(self):
         if self.status == 'buying':
             return self.process_tick_buying(self.tick, self.stop_price,
@@ -74,9 +98,7 @@ class TargetsTradingPlan(TradingPlan):
                self.monitor_order_completion('Stop reached: ')):
                 return False
             elif self.status != 'down':
-                for order in self.update_open_orders():
-                    self.log('Canceling %s' % order)
-                    self.exch.cancel_order(order)
+                self.cancel_orders(self.update_open_orders())
                 if len(self.update_open_orders()) != 0:
                     return True
                 self.order = None
@@ -84,28 +106,40 @@ class TargetsTradingPlan(TradingPlan):
                 self.sell_stop(self.quantity * remain / self.number,
                                self.stop_price)
                 self.status = 'down'
+                self.pending_orders = []
         else:
             if (tick['H'] > self.targets[-1] and
                self.monitor_order_completion('Last target reached: ')):
                 return False
             elif self.status != 'up':
+                orders = []
                 for limit in self.targets[:-1]:
                     if limit:
                         self.log('Limit order %.3f @ %s' %
                                  (self.quantity / self.number, btc2str(limit)))
-                        self.sell_limit(self.quantity / self.number, limit)
-                        self.order = None
+                        orders.append(('sell_limit', self.pair,
+                                       self.quantity / self.number, limit))
                 if self.targets[-1]:
                     self.log('Limit order %.3f @ %s' %
                              (self.quantity - (self.quantity *
                                                (self.number - 1)),
                               btc2str(self.targets[-1])))
-                    self.sell_limit(self.quantity - (self.quantity *
-                                                     (self.number - 1)
-                                                     / self.number),
-                                    self.targets[-1])
+                    orders.append(('sell_limit', self.pair,
+                                   self.quantity - (self.quantity *
+                                                    (self.number - 1)
+                                                    / self.number),
+                                   self.targets[-1]))
+                self.pending_orders = orders
+                self.order_attempts = 0
                 self.status = 'up'
+                if not self.place_pending_orders():
+                    return False
             else:
+                if self.pending_orders:
+                    # keep the target orders already placed
+                    self.order = None
+                    if not self.place_pending_orders():
+                        return False
                 for idx in range(len(self.targets)):
                     if self.targets[idx] and tick['H'] >= self.targets[idx]:
                         self.stop_price = self.stop_entry[self.targets[idx]]
@@ -0,0 +1,59 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import backtest
+from replay import load_trade
+from test_indicators import random_candles
+
+
+class TestBacktest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'TBOT_NO_LOG': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_trade(self, plan, args, count, seed):
+        filename = os.path.join(self.tmpdir, '%s.trade' % plan)
+        data = {'candles': random_candles(count, seed),
+                'plan': plan,
+                'pair': 'BTC-ETH',
+                'balance': 0,
+                'available': 0,
+                'args': args}
+        with gzip.open(filename, 'w') as fout:
+            fout.write(json.dumps(data).encode('utf-8'))
+        return filename
+
+    def check_same_trades(self, plan, args):
+        filename = self.write_trade(plan, args, 8000, 11)
+        with contextlib.redirect_stdout(io.StringIO()):
+            exch, _ = backtest.run(load_trade(filename), '-', ['-b'] + args)
+            ref_exch, _ = backtest.run(load_trade(filename), '-',
+                                       ['-b'] + args, False)
+        self.assertGreater(len(exch.fills), 0)
+        self.assertEqual(exch.fills, ref_exch.fills)
+
+    def test_auto_bbrsi(self):
+        self.check_same_trades('auto_bbrsi_tp', ['BTC-ETH', '1', '15'])
+
+    def test_auto_bb(self):
+        self.check_same_trades('auto_bb_tp',
+                               ['-p', '0.01', 'BTC-ETH', '1', '15'])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_backtest.py ends here
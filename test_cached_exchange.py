@@ -0,0 +1,97 @@
+import threading
+import unittest
+
+from cached_exchange import CachedExchange
+from replay import FakeExchange
+from test_orderbook import candle
+
+
+class CountingExchange(FakeExchange):
+    def __init__(self):
+        super().__init__(0, 0, [])
+        self.reads = 0
+
+    def get_open_orders(self, pair):
+        self.reads += 1
+        return super().get_open_orders(pair)
+
+    def get_position(self, pair):
+        self.reads += 1
+        return super().get_position(pair)
+
+    def get_order_history(self, pair=None):
+        self.reads += 1
+        return super().get_order_history(pair)
+
+    def get_tick(self, pair):
+        return candle(0.1, 0.2)
+
+
+class RacingExchange(CountingExchange):
+    def get_open_orders(self, pair):
+        orders = super().get_open_orders(pair)
+        # a cancel confirmed by another thread during the read
+        thread = threading.Thread(target=self.cached.invalidate)
+        thread.start()
+        thread.join()
+        return orders
+
+
+class TestCachedExchange(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.real = CountingExchange()
+        self.exch = CachedExchange(self.real, 10, lambda: self.now)
+
+    def test_same_tick(self):
+        for _ in range(3):
+            self.assertEqual(self.exch.get_open_orders('BTC-ETH'), [])
+            self.exch.get_position('ETH')
+        self.assertEqual(self.real.reads, 2)
+        self.exch.get_tick('BTC-ETH')
+        self.exch.get_open_orders('BTC-ETH')
+        self.assertEqual(self.real.reads, 3)
+        self.now += 11
+        self.exch.get_open_orders('BTC-ETH')
+        self.assertEqual(self.real.reads, 4)
+        self.assertEqual(self.exch.stats(), {'hits': 4, 'misses': 4})
+
+    def test_invalidated_by_orders(self):
+        self.assertEqual(self.exch.get_open_orders('BTC-ETH'), [])
+        order = self.exch.buy_limit('BTC-ETH', 1, 0.15)
+        self.assertEqual(self.exch.get_open_orders('BTC-ETH'), [order])
+        self.exch.get_position('ETH')
+        self.real.process_tick(candle(0.1, 0.2))
+        self.assertEqual(self.exch.get_position('ETH')['Balance'], 0)
+        # the fill is visible as soon as we look at the order
+        self.exch.update_order(order)
+        self.assertEqual(self.exch.get_position('ETH')['Balance'], 1)
+        self.assertEqual(self.exch.get_order_history('BTC-ETH'), [order])
+        self.assertTrue(self.exch.cancel_order(order))
+        self.assertEqual(self.exch.get_order_history('BTC-ETH'), [order])
+        self.assertEqual(self.real.reads, 6)
+
+    def test_open_orders_changed(self):
+        order = self.real.buy_limit('BTC-ETH', 1, 0.15)
+        self.assertEqual(self.exch.get_open_orders('BTC-ETH'), [order])
+        self.exch.get_position('ETH')
+        self.real.process_tick(candle(0.1, 0.2))
+        self.now += 11
+        self.assertEqual(self.exch.get_open_orders('BTC-ETH'), [])
+        self.assertEqual(self.exch.get_position('ETH')['Balance'], 1)
+
+    def test_invalidated_during_read(self):
+        real = RacingExchange()
+        exch = CachedExchange(real, 10, lambda: self.now)
+        real.cached = exch
+        exch.get_open_orders('BTC-ETH')
+        exch.get_open_orders('BTC-ETH')
+        self.assertEqual(real.reads, 2)
+        self.assertEqual(exch.cache, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_cached_exchange.py ends here
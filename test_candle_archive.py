@@ -0,0 +1,125 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from candle_archive import ArchiveExchange
+from candle_archive import CandleArchive
+from tradefile import load_trade
+from tradefile import time2str
+
+START = 1514963880
+
+
+def candle(ts, close=1.0):
+    return {'T': time2str(ts), 'O': 1.0, 'H': 2.0, 'L': 0.5, 'C': close,
+            'V': 10.0, 'BV': 5.0}
+
+
+class CandlesExchange(object):
+    def __init__(self, candles):
+        self.candles = candles
+        self.calls = 0
+
+    def get_candles(self, pair, duration):
+        self.calls += 1
+        return self.candles
+
+
+class TestCandleArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'BTC-ETH')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_append(self):
+        archive = CandleArchive(self.path)
+        for idx in range(3):
+            self.assertTrue(archive.append(candle(START + idx * 60)))
+        # replaced by the last value of the candle
+        self.assertTrue(archive.append(candle(START + 120, 3.0)))
+        self.assertFalse(archive.append(candle(START)))
+        self.assertEqual(list(archive.candles()),
+                         [candle(START), candle(START + 60),
+                          candle(START + 120, 3.0)])
+        self.assertEqual(list(archive.candles(1)), [candle(START + 120, 3.0)])
+        archive.close()
+
+    def test_partial_write(self):
+        archive = CandleArchive(self.path)
+        archive.extend([candle(START), candle(START + 60)])
+        archive.close()
+        with open(os.path.join(self.path, 'T'), 'ab') as fout:
+            fout.write(b'\0' * 8)
+        archive = CandleArchive(self.path)
+        self.assertEqual(len(archive), 2)
+        self.assertEqual(archive.last_time(), START + 60)
+        archive.close()
+
+    def test_shared(self):
+        # two processes appending to the same archive
+        first = CandleArchive(self.path)
+        second = CandleArchive(self.path)
+        self.assertTrue(first.append(candle(START)))
+        self.assertTrue(second.append(candle(START + 60)))
+        self.assertTrue(first.append(candle(START + 60, 3.0)))
+        self.assertFalse(second.append(candle(START)))
+        self.assertEqual(second.extend([candle(START + idx * 60)
+                                        for idx in range(4)]), 2)
+        self.assertEqual(list(first.candles()),
+                         [candle(START), candle(START + 60, 3.0),
+                          candle(START + 120), candle(START + 180)])
+        first.close()
+        second.close()
+
+    def test_threads(self):
+        exch = ArchiveExchange(CandlesExchange([]), self.tmpdir.name)
+        candles = [candle(START + idx * 60) for idx in range(50)]
+
+        def archive_all():
+            for data in candles:
+                exch.archive_candle('BTC-ETH', data)
+
+        threads = [threading.Thread(target=archive_all) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(list(exch.archive('BTC-ETH').candles()), candles)
+
+    def test_warm_start(self):
+        real = CandlesExchange([candle(START + idx * 60)
+                                for idx in range(10)])
+        now = START + 10 * 60 + 30
+        exch = ArchiveExchange(real, self.tmpdir.name, 5, lambda: now)
+        self.assertEqual(exch.get_candles('BTC-ETH', 'oneMin'),
+                         real.candles[-5:])
+        self.assertEqual(real.calls, 1)
+        # restart in the same minute
+        exch = ArchiveExchange(real, self.tmpdir.name, 5, lambda: now)
+        self.assertEqual(exch.get_candles('BTC-ETH', 'oneMin'),
+                         real.candles[-5:])
+        self.assertEqual(real.calls, 1)
+        exch.archive_candle('BTC-ETH', candle(START + 10 * 60))
+        # the tail missed is downloaded
+        now += 120
+        real.candles = real.candles + [candle(START + idx * 60)
+                                       for idx in range(11, 13)]
+        candles = exch.get_candles('BTC-ETH', 'oneMin')
+        self.assertEqual(real.calls, 2)
+        self.assertEqual(candles[-1], candle(START + 12 * 60))
+        self.assertEqual(exch.stats(), {'local': 1, 'downloads': 1})
+        filename = os.path.join(self.tmpdir.name, 'BTC-ETH.ctrade')
+        exch.archive('BTC-ETH').export(filename, 'BTC-ETH')
+        data = load_trade(filename)
+        self.assertEqual(data['pair'], 'BTC-ETH')
+        self.assertEqual(len(data['candles']), 13)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_candle_archive.py ends here
@@ -0,0 +1,44 @@
+import unittest
+
+from candles import CandleBuffer
+
+
+def candle(minute):
+    return {'T': '2018-01-01T00:%02d:00' % minute,
+            'O': minute, 'H': minute + 1, 'L': minute - 1, 'C': minute + 0.5,
+            'V': 10 * minute, 'BV': minute}
+
+
+class TestCandleBuffer(unittest.TestCase):
+
+    def test_append(self):
+        buf = CandleBuffer(5)
+        for minute in range(3):
+            buf.append(candle(minute))
+        self.assertEqual(len(buf), 3)
+        self.assertEqual(list(buf.column('O')), [0, 1, 2])
+
+    def test_wrap_around(self):
+        buf = CandleBuffer(5)
+        buf.extend([candle(minute) for minute in range(12)])
+        self.assertEqual(len(buf), 5)
+        self.assertEqual(list(buf.column('O')), [7, 8, 9, 10, 11])
+        self.assertEqual(list(buf.timestamps() % 3600),
+                         [420, 480, 540, 600, 660])
+
+    def test_dataframe(self):
+        buf = CandleBuffer(4)
+        for minute in range(6):
+            buf.append(candle(minute))
+        df = buf.to_dataframe()
+        self.assertIs(df, buf.to_dataframe())
+        self.assertEqual(list(df['C']), [2.5, 3.5, 4.5, 5.5])
+        self.assertEqual(df.index[0].minute, 2)
+        buf.append(candle(6))
+        self.assertEqual(buf.to_dataframe().index[-1].minute, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_candles.py ends here
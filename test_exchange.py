@@ -0,0 +1,305 @@
+import gc
+import http.server
+import json
+import threading
+import time
+import unittest
+
+from bittrex_exchange import BittrexError
+from bittrex_exchange import BittrexExchange
+from bittrex_exchange import BittrexOrder
+from bittrex_exchange import SessionDispatch
+from exchange import Exchange
+from exchange import Order
+from exchange import OrderMeta
+
+
+def order_data(oid, closed=None):
+    return {'OrderUuid': oid, 'OrderType': 'LIMIT_SELL', 'Quantity': 1,
+            'Limit': 0.1, 'Closed': closed, 'IsOpen': closed is None}
+
+
+class SlowOrder(Order):
+    __slots__ = ('data',)
+
+    def update(self, data, id=None):
+        # let the other threads look the order up meanwhile
+        time.sleep(0.01)
+        self.data = data
+
+    def is_buy_order(self):
+        return False
+
+    def is_sell_order(self):
+        return True
+
+
+class TestOrderMeta(unittest.TestCase):
+
+    def setUp(self):
+        self.max_closed = OrderMeta.max_closed
+        OrderMeta.max_closed = 10
+
+    def tearDown(self):
+        OrderMeta.max_closed = self.max_closed
+
+    def test_identity(self):
+        order = BittrexOrder(order_data('id-1'), id='id-1')
+        hits = BittrexOrder.stats()['hits']
+        data = order_data('id-1', '2018-01-03T07:18:00')
+        self.assertIs(BittrexOrder(data, id='id-1'), order)
+        self.assertIs(order.data, data)
+        self.assertEqual(BittrexOrder.stats()['hits'], hits + 1)
+
+    def test_open_orders_released(self):
+        size = BittrexOrder.stats()['size']
+        orders = [BittrexOrder(order_data('open-%d' % idx),
+                               id='open-%d' % idx) for idx in range(100)]
+        self.assertEqual(BittrexOrder.stats()['size'], size + 100)
+        del orders
+        gc.collect()
+        self.assertEqual(BittrexOrder.stats()['size'], size)
+
+    def test_closed_orders_bounded(self):
+        for idx in range(100):
+            BittrexOrder(order_data('closed-%d' % idx, '2018-01-03'),
+                         id='closed-%d' % idx)
+        gc.collect()
+        stats = BittrexOrder.stats()
+        self.assertEqual(stats['closed'], 10)
+        self.assertLessEqual(stats['size'], 20)
+        misses = stats['misses']
+        BittrexOrder(order_data('closed-99', '2018-01-03'), id='closed-99')
+        BittrexOrder(order_data('closed-0', '2018-01-03'), id='closed-0')
+        self.assertEqual(BittrexOrder.stats()['misses'], misses + 1)
+
+    def test_threads(self):
+        orders = []
+        barrier = threading.Barrier(8)
+
+        def create():
+            barrier.wait()
+            orders.append(SlowOrder({}, id='slow-1'))
+
+        threads = [threading.Thread(target=create) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(orders), 8)
+        self.assertTrue(all(order is orders[0] for order in orders))
+
+
+class TestBittrexOrder(unittest.TestCase):
+
+    def test_parsed_fields(self):
+        data = {'OrderUuid': 'parsed-1', 'Exchange': 'BTC-ETH',
+                'OrderType': 'LIMIT_SELL', 'Quantity': 2.0,
+                'QuantityRemaining': 1.0, 'Limit': 0.05,
+                'CommissionPaid': 0.0001, 'PricePerUnit': None,
+                'Condition': 'LESS_THAN', 'ConditionTarget': 0.1,
+                'IsConditional': True, 'Closed': None, 'IsOpen': True}
+        order = BittrexOrder(data, id='parsed-1')
+        self.assertFalse(hasattr(order, '__dict__'))
+        self.assertTrue(order.is_sell_order())
+        self.assertFalse(order.is_closed())
+        self.assertEqual((order.pair, order.quantity, order.remaining,
+                          order.limit, order.target, order.commission),
+                         ('BTC-ETH', 2.0, 1.0, 0.05, 0.1, 0.0001))
+        self.assertEqual(str(order), 'SELL STP 2.000 BTC-ETH @ 100000.00S')
+        self.assertIs(order.data, data)
+
+    def test_trade_response(self):
+        order = BittrexOrder({'OrderId': 'trade-1', 'MarketName': 'BTC-ETH',
+                              'BuyOrSell': 'Buy', 'OrderType': 'LIMIT',
+                              'Quantity': 1.0, 'Rate': 0.05},
+                             id='trade-1')
+        self.assertTrue(order.is_buy_order())
+        self.assertEqual(order.limit, 0.05)
+        self.assertEqual(order.commission, 0)
+
+
+class SummariesConnection(object):
+    def __init__(self):
+        self.summaries = []
+        self.candle_calls = 0
+
+    def get_market_summaries(self):
+        return {'success': True,
+                'result': [{'Summary': summary} for summary in self.summaries]}
+
+    def get_latest_candle(self, pair, interval):
+        self.candle_calls += 1
+        return {'success': True,
+                'result': [{'T': '2018-01-03T07:17:00', 'O': 1, 'H': 1,
+                            'L': 1, 'C': 1, 'V': 1, 'BV': 1}]}
+
+
+def summary(pair, ts, last, volume):
+    return {'MarketName': pair, 'TimeStamp': ts, 'Last': last,
+            'Volume': volume, 'BaseVolume': volume / 10}
+
+
+class TestBittrexTicks(unittest.TestCase):
+
+    def test_summaries(self):
+        exch = BittrexExchange(False)
+        exch.conn = SummariesConnection()
+        exch.conn.summaries = [
+            summary('BTC-ETH', '2018-01-03T07:18:05', 2, 100)]
+        ticks = exch.get_ticks(['BTC-ETH', 'BTC-NEO'])
+        # no reference volumes yet and unknown market
+        self.assertEqual(exch.conn.candle_calls, 2)
+        self.assertEqual(ticks['BTC-ETH']['T'], '2018-01-03T07:17:00')
+        exch.conn.summaries = [
+            summary('BTC-ETH', '2018-01-03T07:18:20', 3, 110)]
+        exch.get_ticks(['BTC-ETH'])
+        exch.conn.summaries = [
+            summary('BTC-ETH', '2018-01-03T07:18:40', 1, 115)]
+        tick = exch.get_ticks(['BTC-ETH'])['BTC-ETH']
+        self.assertEqual(exch.conn.candle_calls, 2)
+        self.assertEqual(tick, {'T': '2018-01-03T07:18:00', 'O': 3, 'H': 3,
+                                'L': 1, 'C': 1, 'V': 15, 'BV': 1.5})
+        exch.conn.summaries = [
+            summary('BTC-ETH', '2018-01-03T07:19:00', 2, 90)]
+        tick = exch.get_ticks(['BTC-ETH'])['BTC-ETH']
+        self.assertEqual(tick, {'T': '2018-01-03T07:19:00', 'O': 2, 'H': 2,
+                                'L': 2, 'C': 2, 'V': 0, 'BV': 0})
+
+
+class CancelConnection(object):
+    def __init__(self, open_polls, message='ok'):
+        self.open_polls = open_polls
+        self.message = message
+        self.polls = 0
+
+    def cancel(self, uuid):
+        if self.message != 'ok':
+            return {'success': False, 'message': self.message}
+        return {'success': True, 'result': None}
+
+    def get_order(self, uuid):
+        self.polls += 1
+        closed = None if self.polls <= self.open_polls else \
+            '2018-01-03T07:18:00'
+        return {'success': True, 'result': order_data(uuid, closed)}
+
+
+class TestBittrexCancel(unittest.TestCase):
+
+    def setUp(self):
+        self.exch = BittrexExchange(False)
+        self.order = BittrexOrder(order_data('cancel1'), id='cancel1')
+
+    def test_confirmed(self):
+        self.exch.conn = CancelConnection(2)
+        future = self.exch.cancel_order_async(self.order)
+        self.assertTrue(future.result(5))
+        self.assertEqual(self.exch.conn.polls, 3)
+        self.assertTrue(self.order.is_closed())
+
+    def test_not_open(self):
+        self.exch.conn = CancelConnection(0, 'ORDER_NOT_OPEN')
+        self.assertTrue(self.exch.cancel_order(self.order))
+        self.assertEqual(self.exch.conn.polls, 0)
+
+    def test_deadline(self):
+        self.exch.conn = CancelConnection(100)
+        with self.assertRaises(BittrexError):
+            self.exch.confirm_cancel(self.order, deadline=0.5)
+        # 0.2 then 0.4 would pass the deadline
+        self.assertEqual(self.exch.conn.polls, 2)
+
+
+class SlowExchange(Exchange):
+    """
+    Exchange taking 0.2 s to place an order.
+    """
+    sell_market = buy_limit = buy_limit_range = get_tick = None
+    get_open_orders = cancel_order = get_position = update_order = None
+
+    def sell_limit(self, pair, quantity, value):
+        time.sleep(0.2)
+        return (pair, quantity, value)
+
+    def sell_stop(self, pair, quantity, value):
+        raise BittrexError('INVALID_ORDER')
+
+
+class OrderExchange(SlowExchange):
+    """
+    Exchange building its orders on the threads of submit_orders.
+    """
+    def sell_limit(self, pair, quantity, value):
+        time.sleep(0.1)
+        oid = 'submit-%d' % quantity
+        return BittrexOrder(order_data(oid), id=oid)
+
+
+class TestSubmitOrders(unittest.TestCase):
+
+    def test_concurrent(self):
+        exch = SlowExchange()
+        start = time.time()
+        results = exch.submit_orders([('sell_limit', 'BTC-ETH', idx, 0.1)
+                                      for idx in range(4)] +
+                                     [('sell_stop', 'BTC-ETH', 1, 0.05)])
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(results[:4], [('BTC-ETH', idx, 0.1)
+                                       for idx in range(4)])
+        self.assertIsInstance(results[4], BittrexError)
+
+    def test_orders_threads(self):
+        exch = OrderExchange()
+        start = time.time()
+        results = exch.submit_orders([('sell_limit', 'BTC-ETH', idx % 2, 0.1)
+                                      for idx in range(8)])
+        self.assertLess(time.time() - start, 0.4)
+        # one object per order id whatever the thread creating it
+        self.assertEqual(len(set(id(order) for order in results)), 2)
+        self.assertEqual(sorted(set(order.id for order in results)),
+                         ['submit-0', 'submit-1'])
+
+
+class JSONHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'success': True,
+                           'apisign': self.headers['apisign']}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSessionDispatch(unittest.TestCase):
+
+    def test_keep_alive(self):
+        server = http.server.ThreadingHTTPServer(('localhost', 0),
+                                                 JSONHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            dispatch = SessionDispatch(pool_size=2)
+            url = 'http://localhost:%d/api' % server.server_address[1]
+            for idx in range(10):
+                self.assertEqual(dispatch(url, 'sign%d' % idx),
+                                 {'success': True, 'apisign': 'sign%d' % idx})
+            stats = dispatch.stats()
+            self.assertEqual(stats['requests'], 10)
+            self.assertEqual(stats['connections'], 1)
+            self.assertAlmostEqual(stats['reuse_rate'], 0.9)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_exchange.py ends here
@@ -0,0 +1,112 @@
+from datetime import datetime
+from datetime import timedelta
+import random
+import unittest
+
+import pandas as pd
+
+from indicators import IndicatorEngine
+from indicators import RollingWindow
+from utils import ATR_STP, BB, MA, RSI
+
+COLUMNS = ('BBM', 'BBU', 'BBL', 'BBW', 'VMA20', 'RSI', 'ATR_STP')
+
+
+def random_candles(count, seed, gaps=False):
+    rnd = random.Random(seed)
+    start = datetime(2018, 1, 3, 7, 12)
+    price = 0.001
+    candles = []
+    minute = 0
+    for _ in range(count):
+        minute += 1
+        if gaps and rnd.random() < 0.005:
+            minute += rnd.randint(1, 90)
+        opening = price
+        price = max(price * (1 + rnd.gauss(0, 0.004)), 0.00001)
+        high = max(opening, price) * (1 + abs(rnd.gauss(0, 0.002)))
+        low = min(opening, price) * (1 - abs(rnd.gauss(0, 0.002)))
+        volume = rnd.uniform(0, 1000)
+        candles.append({'T': (start + timedelta(minutes=minute)).strftime(
+            '%Y-%m-%dT%H:%M:%S'),
+                        'O': opening, 'H': high, 'L': low, 'C': price,
+                        'V': volume, 'BV': volume * price})
+    return candles
+
+
+def pandas_indicators(candles, period):
+    df = pd.DataFrame(candles)
+    df['T'] = pd.to_datetime(df['T'])
+    df = df.set_index('T')
+    ohlc_dict = {'O': 'first', 'H': 'max', 'L': 'min', 'C': 'last',
+                 'V': 'sum', 'BV': 'sum'}
+    ndf = df.resample('%dmin' % period).apply(ohlc_dict)
+    BB(ndf)
+    MA(ndf, 20, 'V', 'VMA20')
+    RSI(ndf)
+    ATR_STP(ndf)
+    return ndf
+
+
+class RecordingEngine(IndicatorEngine):
+    def __init__(self, period):
+        super().__init__(period)
+        self.rows = []
+
+    def _close(self, bar):
+        row = super()._close(bar)
+        self.rows.append(row)
+        return row
+
+
+def engine_rows(candles, period):
+    engine = RecordingEngine(period)
+    for candle in candles:
+        engine.update(candle)
+    return engine.rows
+
+
+class TestIndicators(unittest.TestCase):
+
+    def check(self, candles, period):
+        ndf = pandas_indicators(candles, period)
+        rows = engine_rows(candles, period)
+        # the last bar is still open for the engine
+        self.assertEqual(len(rows), len(ndf) - 1)
+        for idx, row in enumerate(rows):
+            expected = ndf.iloc[idx]
+            for col in ('O', 'H', 'L', 'C', 'V', 'BV') + COLUMNS:
+                if pd.isna(expected[col]):
+                    self.assertTrue(row[col] != row[col],
+                                    '%s %d %s' % (col, idx, row[col]))
+                else:
+                    self.assertAlmostEqual(
+                        row[col], expected[col],
+                        delta=abs(expected[col]) * 1e-9 + 1e-12,
+                        msg='%s %d' % (col, idx))
+
+    def test_long_series(self):
+        self.check(random_candles(30000, 1), 30)
+
+    def test_one_minute_period(self):
+        self.check(random_candles(5000, 2), 1)
+
+    def test_period_not_dividing_a_day(self):
+        self.check(random_candles(10000, 3), 7)
+
+    def test_gaps(self):
+        self.check(random_candles(20000, 4, gaps=True), 15)
+
+    def test_rolling_window(self):
+        window = RollingWindow(3)
+        for val in (1.0, 2.0, 4.0, 8.0):
+            window.push(val)
+        self.assertAlmostEqual(window.mean(), 14.0 / 3)
+        self.assertAlmostEqual(window.std(),
+                               pd.Series([2.0, 4.0, 8.0]).std())
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_indicators.py ends here
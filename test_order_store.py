@@ -0,0 +1,69 @@
+import unittest
+
+from bittrex_exchange import BittrexExchange
+from order_store import OrderStore
+
+
+def order_data(oid, market, closed):
+    return {'OrderUuid': oid, 'Exchange': market, 'OrderType': 'LIMIT_SELL',
+            'Quantity': 1, 'Limit': 0.1, 'Closed': closed, 'IsOpen': False}
+
+
+class HistoryConnection(object):
+    def __init__(self, history):
+        self.history = history
+
+    def get_order_history(self, pair):
+        return {'success': True,
+                'result': [data for data in self.history
+                           if pair is None or data['Exchange'] == pair]}
+
+
+class TestOrderStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = OrderStore(':memory:')
+
+    def test_sync(self):
+        history = [order_data('o2', 'BTC-NEO', '2018-01-03T07:20:00'),
+                   order_data('o1', 'BTC-ETH', '2018-01-03T07:18:00')]
+        self.assertEqual(self.store.sync(history), 2)
+        self.assertEqual(self.store.sync(history), 0)
+        history.insert(0, order_data('o3', 'BTC-ETH', '2018-01-03T07:22:00'))
+        self.assertEqual(self.store.sync(history), 1)
+        self.assertEqual([data['OrderUuid']
+                          for data in self.store.history('BTC-ETH')],
+                         ['o3', 'o1'])
+        self.assertEqual(len(self.store.history()), 3)
+
+    def test_sync_markets(self):
+        eth = order_data('e1', 'BTC-ETH', '2018-01-03T07:18:00')
+        self.assertEqual(self.store.sync([eth]), 1)
+        # new order on another market behind a known one
+        neo = order_data('n1', 'BTC-NEO', '2018-01-03T07:10:00')
+        self.assertEqual(self.store.sync([eth, neo]), 1)
+        self.assertEqual([data['OrderUuid']
+                          for data in self.store.history('BTC-NEO')], ['n1'])
+        self.assertEqual(self.store.inserted, 2)
+
+    def test_exchange(self):
+        exch = BittrexExchange(False)
+        exch.order_store = self.store
+        exch.conn = HistoryConnection(
+            [order_data('o2', 'BTC-ETH', '2018-01-03T07:20:00'),
+             order_data('o1', 'BTC-ETH', '2018-01-03T07:18:00')])
+        self.assertEqual([order.id for order in
+                          exch.get_order_history('BTC-ETH')], ['o2', 'o1'])
+        # older orders are kept when they leave the history of the API
+        exch.conn.history = [order_data('o3', 'BTC-ETH',
+                                        '2018-01-03T07:22:00')]
+        self.assertEqual([order.id for order in
+                          exch.get_order_history('BTC-ETH')],
+                         ['o3', 'o2', 'o1'])
+        self.assertEqual(self.store.inserted, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_order_store.py ends here
@@ -0,0 +1,83 @@
+import unittest
+
+from orderbook import OrderBook
+from replay import FakeExchange
+
+
+def candle(low, high, ts='2018-01-03T07:18:00'):
+    return {'O': low, 'H': high, 'L': low, 'C': high, 'V': 1, 'BV': 1,
+            'T': ts}
+
+
+class TestOrderBook(unittest.TestCase):
+
+    def test_limit_orders(self):
+        book = OrderBook(0.01)
+        sells = [book.add('BTC-ETH', 'LIMIT_SELL', 1, limit)
+                 for limit in (0.3, 0.1, 0.2)]
+        buy = book.add('BTC-ETH', 'LIMIT_BUY', 2, 0.05)
+        fills = book.match(candle(0.06, 0.25))
+        self.assertEqual([data['Limit'] for data in fills], [0.1, 0.2])
+        self.assertEqual(fills[1]['PricePerUnit'], 0.2)
+        self.assertAlmostEqual(fills[0]['PricePerUnit'], 0.155)
+        self.assertAlmostEqual(fills[1]['Commission'], 0.002)
+        self.assertEqual(book.open_orders(), [buy, sells[0]])
+        self.assertEqual(book.reserved('BTC-ETH'), 1)
+        fills = book.match(candle(0.04, 0.05))
+        self.assertEqual(fills, [buy])
+        self.assertEqual(buy['PricePerUnit'], 0.045)
+        self.assertEqual(book.history(), [buy, sells[2], sells[1]])
+
+    def test_conditional_orders(self):
+        book = OrderBook()
+        stop = book.add('BTC-ETH', 'LIMIT_SELL', 1, 0.05, 'LESS_THAN', 0.1)
+        rng = book.add('BTC-ETH', 'LIMIT_BUY', 1, 0.22, 'GREATER_THAN', 0.2)
+        self.assertEqual(book.match(candle(0.11, 0.19)), [])
+        self.assertEqual(book.match(candle(0.09, 0.19)), [stop])
+        self.assertAlmostEqual(stop['PricePerUnit'], 0.095)
+        self.assertEqual(book.match(candle(0.21, 0.25)), [rng])
+        self.assertEqual(rng['PricePerUnit'], 0.21)
+        # triggered above the limit, waits like a limit order
+        late = book.add('BTC-ETH', 'LIMIT_BUY', 1, 0.22, 'GREATER_THAN', 0.2)
+        self.assertEqual(book.match(candle(0.23, 0.25)), [])
+        self.assertEqual(book.match(candle(0.21, 0.23)), [late])
+        self.assertEqual(late['PricePerUnit'], 0.22)
+
+    def test_cancel(self):
+        book = OrderBook()
+        orders = [book.add('BTC-ETH', 'LIMIT_SELL', 1, 0.1 + idx * 0.001)
+                  for idx in range(200)]
+        for data in orders[:-1]:
+            book.cancel(data['OrderUuid'])
+        self.assertFalse(orders[0]['IsOpen'])
+        self.assertLess(len(book._sells), 200)
+        self.assertEqual(book.match(candle(0.1, 0.5)), [orders[-1]])
+
+
+class TestFakeExchange(unittest.TestCase):
+
+    def test_orders(self):
+        exch = FakeExchange(0, 0, [])
+        buy = exch.buy_limit_range('BTC-ETH', 2, 0.1, 0.11)
+        exch.process_tick(candle(0.09, 0.1))
+        self.assertEqual(exch.get_open_orders('BTC-ETH'), [buy])
+        exch.process_tick(candle(0.1, 0.12))
+        self.assertEqual(exch.get_position('BTC-ETH'),
+                         {'Balance': 2, 'Available': 2})
+        first = exch.sell_limit('BTC-ETH', 1, 0.2)
+        second = exch.sell_limit('BTC-ETH', 1, 0.3)
+        self.assertEqual(exch.get_position('BTC-ETH')['Available'], 0)
+        exch.process_tick(candle(0.15, 0.25, '2018-01-03T07:19:00'))
+        self.assertIsNotNone(exch.update_order(first).price_per_unit)
+        self.assertEqual(exch.get_order_history('BTC-ETH'), [first, buy])
+        self.assertTrue(exch.cancel_order(second))
+        self.assertEqual(exch.get_open_orders('BTC-ETH'), [])
+        self.assertEqual(exch.get_position('BTC-ETH')['Balance'], 1)
+        self.assertEqual([fill[1] for fill in exch.fills], ['BUY', 'SELL'])
+        self.assertEqual(exch.fills[1][0], '2018-01-03T07:19:00')
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_orderbook.py ends here
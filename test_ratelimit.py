@@ -0,0 +1,91 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from bittrex_exchange import request_priority
+from ratelimit import HISTORY
+from ratelimit import ORDER
+from ratelimit import READ
+from ratelimit import TokenBucket
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def bucket(self, lock_file=None):
+        return TokenBucket(1, 5, lock_file, clock=self.clock,
+                           sleep=self.clock.sleep)
+
+    def test_rate(self):
+        bucket = self.bucket()
+        for _ in range(5):
+            self.assertEqual(bucket.acquire(ORDER), 0)
+        self.assertAlmostEqual(bucket.acquire(ORDER), 1)
+        self.assertAlmostEqual(self.clock.now, 1001)
+        self.assertEqual(bucket.stats(), {'requests': 6, 'throttled': 1,
+                                          'waited': 1})
+
+    def test_priorities(self):
+        bucket = self.bucket()
+        self.assertEqual(bucket.try_acquire(HISTORY), 0)
+        self.assertEqual(bucket.try_acquire(HISTORY), 0)
+        self.assertAlmostEqual(bucket.try_acquire(HISTORY), 1)
+        self.assertEqual(bucket.try_acquire(READ), 0)
+        self.assertAlmostEqual(bucket.try_acquire(READ), 0.5)
+        self.assertEqual(bucket.try_acquire(ORDER), 0)
+        self.assertEqual(bucket.try_acquire(ORDER), 0)
+        self.assertAlmostEqual(bucket.try_acquire(ORDER), 1)
+
+    def test_shared_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lock_file = os.path.join(tmpdir, 'rate')
+            first = self.bucket(lock_file)
+            second = self.bucket(lock_file)
+            for _ in range(3):
+                self.assertEqual(first.try_acquire(ORDER), 0)
+            for _ in range(2):
+                self.assertEqual(second.try_acquire(ORDER), 0)
+            # the 5 tokens are used by the two buckets
+            self.assertAlmostEqual(second.try_acquire(ORDER), 1)
+            first.close()
+            second.close()
+
+    def test_async(self):
+        bucket = TokenBucket(100, 1)
+        waits = asyncio.run(self.acquire_many(bucket, 3))
+        self.assertEqual(waits[0], 0)
+        self.assertGreater(sum(waits), 0.015)
+
+    async def acquire_many(self, bucket, count):
+        return await asyncio.gather(*[bucket.acquire_async(ORDER)
+                                      for _ in range(count)])
+
+    def test_request_priority(self):
+        url = 'https://bittrex.com/api/v2.0/key/market/%s?apikey=k&nonce=1'
+        self.assertEqual(request_priority(url % 'tradesell'), ORDER)
+        self.assertEqual(request_priority(url % 'tradecancel'), ORDER)
+        self.assertEqual(request_priority(url % 'getopenorders'), READ)
+        self.assertEqual(request_priority(url % 'GetOrderHistory'), HISTORY)
+        self.assertEqual(
+            request_priority('https://bittrex.com/api/v2.0/key/balance/'
+                             'getbalance?currencyname=ETH'), HISTORY)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_ratelimit.py ends here
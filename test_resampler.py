@@ -0,0 +1,47 @@
+import unittest
+
+import pandas as pd
+
+from resampler import Resampler
+from test_indicators import random_candles
+
+
+def pandas_resample(candles, period):
+    df = pd.DataFrame(candles)
+    df['T'] = pd.to_datetime(df['T'])
+    df = df.set_index('T')
+    ohlc_dict = {'O': 'first', 'H': 'max', 'L': 'min', 'C': 'last',
+                 'V': 'sum', 'BV': 'sum'}
+    return df.resample('%dmin' % period).apply(ohlc_dict)
+
+
+class TestResampler(unittest.TestCase):
+
+    def test_multi_period(self):
+        candles = random_candles(3000, 5, gaps=True)
+        resampler = Resampler((60, 30, 15))
+        for candle in candles:
+            resampler.update(candle)
+        for period in (60, 30, 15):
+            expected = pandas_resample(candles, period)
+            ndf = resampler.to_dataframe(period)
+            self.assertEqual(list(ndf.index), list(expected.index))
+            pd.testing.assert_frame_equal(ndf, expected[list(ndf.columns)],
+                                          check_freq=False,
+                                          check_dtype=False,
+                                          check_index_type=False)
+
+    def test_bounded(self):
+        resampler = Resampler((5,), 3)
+        for candle in random_candles(100, 6):
+            resampler.update(candle)
+        bars = resampler[5]
+        self.assertEqual(len(bars.closed), 3)
+        self.assertEqual(len(bars.to_dataframe()), 4)
+        self.assertEqual(bars.current['T'] - bars.closed[-1]['T'], 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_resampler.py ends here
@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from market_data import Backfill
+from market_data import FeedExchange
+from market_data import MarketDataHub
+from replay import FakeExchange
+from runtime import PlanTask
+from runtime import Runtime
+from scheduler import PollScheduler
+from test_indicators import random_candles
+from trading_plan import TradingPlan
+from trade import main_loop
+from tradefile import read_json
+
+
+class CountingTradingPlan(TradingPlan):
+    def __init__(self, exch, name, args, buy):
+        super().__init__(exch, name, args, buy)
+        self.count = int(args[1])
+        self.processed = 0
+
+    def process_tick(self):
+        self.processed += 1
+        return self.processed < self.count
+
+
+trading_plan_class = CountingTradingPlan
+
+
+class PairsExchange(FakeExchange):
+    def __init__(self, candles):
+        super().__init__(0, 0, candles[:10])
+        self.next_candles = {}
+        self.tick_calls = 0
+        self.candle_calls = 0
+        self.all_candles = candles
+
+    def get_tick(self, pair):
+        self.tick_calls += 1
+        if pair not in self.next_candles:
+            self.next_candles[pair] = iter(self.all_candles[10:])
+        return next(self.next_candles[pair])
+
+    def get_candles(self, pair, duration):
+        self.candle_calls += 1
+        return super().get_candles(pair, duration)
+
+
+class TickExchange(FakeExchange):
+    def __init__(self, candles):
+        super().__init__(0, 0, candles[:10])
+        self.next_candles = iter(candles[10:])
+
+    def get_tick(self, pair):
+        if pair == 'BTC-BAD':
+            raise ValueError('unknown pair')
+        return next(self.next_candles)
+
+
+class TestRuntime(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'TBOT_NO_LOG': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_plans_isolated(self):
+        candles = random_candles(100, 5)
+        tasks = [PlanTask(TickExchange(candles),
+                          ['test_runtime', 'BTC-ETH', '20']),
+                 PlanTask(TickExchange(candles),
+                          ['test_runtime', 'BTC-BAD', '20']),
+                 PlanTask(TickExchange(candles),
+                          ['test_runtime', '-b', 'BTC-ETH', '30'])]
+        runtime = Runtime(0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(runtime.run(tasks))
+        runtime.shutdown()
+        self.assertEqual([task.trading_plan.processed for task in tasks],
+                         [20, 0, 30])
+        self.assertIsNone(tasks[0].error)
+        self.assertIn('unknown pair', tasks[1].error)
+        self.assertTrue(tasks[2].trading_plan.buy)
+        prefix = 'BTC-ETH-test_runtime-%s' % candles[0]['T']
+        data = read_json(prefix + '.trade')
+        self.assertEqual(data['candles'], candles[:30])
+        self.assertEqual(data['args'], ['BTC-ETH', '20'])
+        data = read_json(prefix + '-2.trade')
+        self.assertEqual(data['candles'], candles[:40])
+
+    def test_hub(self):
+        candles = random_candles(100, 5)
+        exch = PairsExchange(candles)
+        hub = MarketDataHub(exch)
+        plans = [['test_runtime', 'BTC-ETH', '20'],
+                 ['test_runtime', 'BTC-ETH', '30'],
+                 ['test_runtime', 'BTC-NEO', '25']]
+        tasks = []
+        for argv in plans:
+            feed = FeedExchange(hub)
+            tasks.append(PlanTask(feed, argv, feed))
+        runtime = Runtime(0, hub=hub)
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(runtime.run(tasks))
+        runtime.shutdown()
+        self.assertEqual([task.trading_plan.processed for task in tasks],
+                         [20, 30, 25])
+        self.assertEqual(exch.candle_calls, 2)
+        self.assertEqual(hub.stats()['candle_calls'], 2)
+        self.assertEqual(exch.tick_calls, hub.stats()['tick_calls'])
+        # the plans of a pair got the same candles from the same polls
+        self.assertEqual(tasks[1].ticks[:30], tasks[0].ticks)
+        self.assertEqual([len(task.ticks) for task in tasks],
+                         [30, 40, 35])
+        self.assertEqual(tasks[0].ticks, candles[:30])
+
+
+class GapExchange(FakeExchange):
+    def __init__(self, candles, ticks, lost):
+        super().__init__(0, 0, candles[:10])
+        self.all_candles = candles
+        self.next_candles = iter(ticks)
+        self.lost = lost
+        self.candle_calls = 0
+
+    def get_tick(self, pair):
+        return next(self.next_candles)
+
+    def get_candles(self, pair, duration):
+        self.candle_calls += 1
+        return [candle for candle in self.all_candles
+                if candle not in self.lost]
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'TBOT_NO_LOG': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_main_loop(self):
+        candles = random_candles(20, 7)
+        exch = GapExchange(candles, [candles[10], candles[11], candles[14],
+                                     candles[15]], [candles[13]])
+        trading_plan = CountingTradingPlan(exch, 'test_runtime',
+                                           ['BTC-ETH', '5'], False)
+        ticks = list(candles[:10])
+        backfill = Backfill(exch)
+        with mock.patch('time.sleep'):
+            main_loop(exch, 'BTC-ETH', trading_plan, ticks,
+                      PollScheduler(), backfill)
+        self.assertEqual(ticks, candles[:13] + candles[14:16])
+        self.assertEqual(exch.candle_calls, 1)
+        self.assertEqual(backfill.stats(),
+                         {'gaps': 1, 'backfilled': 1, 'lost': 1})
+
+    def test_hub_history(self):
+        candles = random_candles(20, 7)
+        exch = GapExchange(candles, [], [])
+        hub = MarketDataHub(exch)
+        feed = FeedExchange(hub)
+        # history read when the plan started, before the gap
+        exch.all_candles = candles[:10]
+        backfill = Backfill(feed)
+        backfill.start('BTC-ETH', feed.get_candles('BTC-ETH', 'oneMin'))
+        exch.all_candles = candles
+        self.assertEqual(backfill.fill('BTC-ETH', candles[12]),
+                         candles[10:13])
+        self.assertEqual(exch.candle_calls, 2)
+        self.assertEqual(backfill.stats(),
+                         {'gaps': 1, 'backfilled': 2, 'lost': 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_runtime.py ends here
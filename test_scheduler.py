@@ -0,0 +1,64 @@
+import unittest
+
+from scheduler import PollScheduler
+from scheduler import near_trigger
+from tradefile import time2str
+
+START = 1514963880
+
+
+def simulate(scheduler, lag, minutes, near=False):
+    """
+    Poll an exchange publishing the candle of each minute lag seconds
+    after its close. Return the number of polls and the mean delay
+    between the publication and the poll seeing a candle.
+    """
+    now = START + 5
+    seen = None
+    delays = []
+    polls = 0
+    while now < START + minutes * 60:
+        polls += 1
+        # start of the last published candle
+        ts = (now - lag) // 60 * 60 - 60
+        tick = {'T': time2str(ts)}
+        if scheduler.record('BTC-ETH', tick, now) and seen is not None:
+            delays.append(now - (ts + 60 + lag))
+        seen = ts
+        now += scheduler.next_delay('BTC-ETH', near, now)
+    return polls, sum(delays) / len(delays)
+
+
+class TestPollScheduler(unittest.TestCase):
+
+    def test_aligned_on_close(self):
+        scheduler = PollScheduler()
+        polls, latency = simulate(scheduler, 7, 120)
+        # a fixed 30 seconds sleep polls twice a minute with 15 s latency
+        self.assertLess(polls, 120 * 1.5)
+        self.assertLess(latency, 3)
+        self.assertAlmostEqual(scheduler.lag('BTC-ETH'), 7, delta=2)
+
+    def test_backoff(self):
+        scheduler = PollScheduler()
+        tick = {'T': time2str(START)}
+        scheduler.record('BTC-ETH', tick, START + 60)
+        scheduler.record('BTC-ETH', tick, START + 130)
+        delays = []
+        now = START + 130
+        for _ in range(6):
+            delays.append(scheduler.next_delay('BTC-ETH', now=now))
+            now += delays[-1]
+            scheduler.record('BTC-ETH', tick, now)
+        self.assertEqual(delays, [4, 8, 16, 30, 30, 30])
+        self.assertEqual(scheduler.next_delay('BTC-ETH', True, now), 5)
+
+    def test_near_trigger(self):
+        self.assertTrue(near_trigger(100, [None, 100.4]))
+        self.assertFalse(near_trigger(100, [99, 101]))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_scheduler.py ends here
@@ -0,0 +1,79 @@
+import asyncio
+import contextlib
+import io
+import threading
+import unittest
+
+from replay import FakeExchange
+from stream import CandleBuilder
+from stream import ReplayServer
+from stream import StreamExchange
+from stream import candle_messages
+from test_indicators import random_candles
+from utils import candle_time
+
+
+class TestCandleBuilder(unittest.TestCase):
+
+    def test_rebuild(self):
+        candles = random_candles(50, 3)
+        builder = CandleBuilder()
+        for candle in candles:
+            for message in candle_messages('BTC-ETH', candle):
+                ts = candle_time(message)
+                if 'pair' in message:
+                    builder.trade(ts, message['price'], message['quantity'],
+                                  message['base'])
+                else:
+                    builder.advance(ts)
+        self.assertEqual(list(builder.closed), candles)
+
+
+class TestStream(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(5)
+        self.loop.close()
+
+    def start_server(self, server):
+        def started(ws_server):
+            self.port = list(ws_server.sockets)[0].getsockname()[1]
+            self.started.set()
+
+        def run():
+            self.task = self.loop.create_task(
+                server.serve('localhost', 0, started))
+            try:
+                self.loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                pass
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        self.started.wait(5)
+
+    def test_reconnect_backfill(self):
+        candles = random_candles(60, 7)
+        self.start_server(ReplayServer('BTC-ETH', candles, drop_after=20,
+                                       skip=5))
+        exch = StreamExchange(FakeExchange(0, 0, candles),
+                              'ws://localhost:%d' % self.port)
+        ticks = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            while len(ticks) < 60 and exch.wait_tick('BTC-ETH', 10):
+                ticks.append(exch.get_tick('BTC-ETH'))
+        exch.close()
+        self.assertEqual(ticks, candles)
+        self.assertGreater(exch.connects, 1)
+        self.assertEqual(exch.backfilled, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_stream.py ends here
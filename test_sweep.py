@@ -0,0 +1,102 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import backtest
+import sweep
+from replay import load_trade
+from test_indicators import random_candles
+
+
+class FillsExchange(object):
+    def __init__(self, fills, candles):
+        self.fills = fills
+        self.candles = candles
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'TBOT_NO_LOG': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_grid(self):
+        self.assertEqual(sweep.parse_grid(['period=15,30', 'percent=0.05']),
+                         [('period', ['15', '30']), ('percent', ['0.05'])])
+        self.assertEqual(sweep.parse_grid([]), [])
+        for spec in ('period', 'period='):
+            with self.assertRaises(ValueError):
+                sweep.parse_grid([spec])
+
+    def test_missing_params(self):
+        template = sweep.TEMPLATES['trailing_tp']
+        self.assertEqual(sweep.missing_params('trailing_tp', template, []),
+                         ['entry', 'quantity', 'stop', 'target'])
+        grid = sweep.parse_grid(['quantity=1', 'stop=0.0009',
+                                 'entry=0.001', 'target=0.0012'])
+        self.assertEqual(sweep.missing_params('trailing_tp', template, grid),
+                         [])
+
+    def test_run_errors(self):
+        filename = os.path.join(self.tmpdir, 'missing.trade')
+        res = sweep.run_one(('auto_bb_tp', sweep.TEMPLATES['auto_bb_tp'],
+                             filename, {'period': '15'}))
+        self.assertEqual(res[:5], (filename, [], None, 0, 0))
+        self.assertIn('FileNotFoundError', res[5])
+
+    def test_compute_metrics(self):
+        exch = FillsExchange(
+            [('2018-01-03T07:18:00', 'BUY', 'buy', 100, 0.001, 0),
+             ('2018-01-03T07:19:00', 'SELL', 'sell', 50, 0.0008, 0),
+             ('2018-01-03T07:20:00', 'SELL', 'sell', 50, 0.0012, 0)],
+            [{'C': 0.0015}])
+        # equity: 1.0 after the buy, 0.98 after the first sell, then 1.0
+        final, trades, drawdown = sweep.compute_metrics(exch, object(), 1, 0)
+        self.assertAlmostEqual(final, 1.0)
+        self.assertEqual(trades, 2)
+        self.assertAlmostEqual(drawdown, 2.0)
+
+    def test_sweep(self):
+        filename = os.path.join(self.tmpdir, 'auto_bb_tp.trade')
+        data = {'candles': random_candles(5000, 11),
+                'plan': 'auto_bb_tp',
+                'pair': 'BTC-ETH',
+                'balance': 0,
+                'available': 0,
+                'args': []}
+        with gzip.open(filename, 'w') as fout:
+            fout.write(json.dumps(data).encode('utf-8'))
+        grid = sweep.parse_grid(['period=15,30', 'percent=0.01'])
+        results = sweep.sweep('auto_bb_tp', sweep.TEMPLATES['auto_bb_tp'],
+                              [filename], grid, 1)
+        self.assertEqual(len(results), 2)
+        self.assertEqual([res[5] for res in results], [None, None])
+        self.assertEqual(sorted(res[1][-1] for res in results), ['15', '30'])
+        self.assertGreater(results[0][3], 0)
+        self.assertGreaterEqual(results[0][2], results[1][2])
+        # same result as a single backtest
+        filename, args, final, _, _, _ = results[0]
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, trading_plan = backtest.run(load_trade(filename), '-', args)
+        self.assertAlmostEqual(final, trading_plan.amount)
+        # a bad template only fails its runs
+        results = sweep.sweep('auto_bb_tp', '{pair} {amount} {nope}',
+                              [filename], grid, 1)
+        self.assertEqual([res[5] for res in results], ["KeyError('nope')"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_sweep.py ends here
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import tradefile
+from test_indicators import random_candles
+
+
+class TestTradeFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = {'candles': random_candles(1000, 3),
+                     'plan': 'auto_bb_tp',
+                     'pair': 'BTC-ETH',
+                     'balance': 1.5,
+                     'available': 0,
+                     'args': ['BTC-ETH', '1', '30']}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def test_round_trip(self):
+        tradefile.write_json(self.path('a.trade'), self.data)
+        tradefile.write_columnar(self.path('b.trade'),
+                                 tradefile.load_trade(self.path('a.trade')))
+        self.assertTrue(tradefile.is_columnar(self.path('b.trade')))
+        tradefile.write_json(self.path('c.trade'),
+                             tradefile.load_trade(self.path('b.trade')))
+        self.assertFalse(tradefile.is_columnar(self.path('c.trade')))
+        self.assertEqual(tradefile.load_trade(self.path('c.trade')),
+                         self.data)
+
+    def test_memory_mapped(self):
+        tradefile.write_columnar(self.path('b.trade'), self.data)
+        data = tradefile.load_trade(self.path('b.trade'))
+        candles = data['candles']
+        self.assertIsInstance(candles.times, np.memmap)
+        self.assertEqual(data['args'], self.data['args'])
+        self.assertEqual(len(candles), 1000)
+        self.assertEqual(candles[10], self.data['candles'][10])
+        self.assertEqual(list(candles[990:]), self.data['candles'][990:])
+
+    def test_lossy_candle(self):
+        self.data['candles'][5]['T'] = '2018-01-03T07:18:00.5'
+        self.assertRaises(ValueError, tradefile.write_columnar,
+                          self.path('b.trade'), self.data)
+
+    def write_journal(self, frame_records):
+        meta = dict((key, val) for key, val in self.data.items()
+                    if key != 'candles')
+        journal = tradefile.TradeJournal(self.path('j.trade'), meta,
+                                         frame_records)
+        journal.extend(self.data['candles'][:900])
+        journal.event({'type': 'order', 'order': 'SELL'})
+        journal.extend(self.data['candles'][900:])
+        return journal
+
+    def test_journal(self):
+        journal = self.write_journal(100)
+        self.assertEqual(len(journal), 1000)
+        self.assertEqual(journal.last, self.data['candles'][-1])
+        self.assertEqual(journal[-1], self.data['candles'][-1])
+        with self.assertRaises(IndexError):
+            journal[0]
+        journal.close()
+        data = tradefile.load_trade(self.path('j.trade'))
+        self.assertEqual(data.pop('events'), [{'type': 'order',
+                                               'order': 'SELL'}])
+        self.assertEqual(data, self.data)
+
+    def test_truncated_journal(self):
+        journal = self.write_journal(300)
+        # the frame of the last 100 candles is not written yet
+        self.assertEqual(journal.frames, 4)
+        size = os.path.getsize(self.path('j.trade'))
+        with open(self.path('j.trade'), 'rb') as fin:
+            content = fin.read()
+        with open(self.path('t.trade'), 'wb') as fout:
+            fout.write(content[:size - 10])
+        data = tradefile.load_trade(self.path('t.trade'))
+        self.assertEqual(data['candles'], self.data['candles'][:600])
+        journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_tradefile.py ends here
@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from bittrex_exchange import BittrexError
+from replay import FakeExchange
+from targets_tp import MAX_ORDER_ATTEMPTS
+from targets_tp import TargetsTradingPlan
+from trading_plan import TradingPlan
+
+ARGS = ['BTC-ETH', '10', '0.0009', '0.001', '0.0011', '0.0012']
+
+
+def candle(low, high):
+    return {'T': '2018-01-03T07:18:00', 'O': low, 'H': high, 'L': low,
+            'C': high, 'V': 1, 'BV': 1}
+
+
+class FailingExchange(FakeExchange):
+    """
+    Refuse the orders at some limits, and the stops for lack of funds
+    a number of times.
+    """
+    def __init__(self, bad_limits=(), funds_errors=0):
+        super().__init__(10, 10, [])
+        self.bad_limits = bad_limits
+        self.funds_errors = funds_errors
+
+    def sell_limit(self, pair, quantity, limit):
+        if limit in self.bad_limits:
+            raise ValueError('bad limit')
+        return super().sell_limit(pair, quantity, limit)
+
+    def sell_stop(self, pair, quantity, stop):
+        if self.funds_errors:
+            self.funds_errors -= 1
+            raise BittrexError('INSUFFICIENT_FUNDS')
+        return super().sell_stop(pair, quantity, stop)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'TBOT_NO_LOG': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmpdir = tempfile.mkdtemp()
+        TradingPlan.checkpoint_dir = self.tmpdir
+        self.exch = FakeExchange(10, 10, [])
+        trading_plan = TargetsTradingPlan(self.exch, 'targets_tp', ARGS,
+                                          False)
+        trading_plan.tick = candle(0.00101, 0.00102)
+        trading_plan.process_tick()
+        self.assertEqual(trading_plan.status, 'up')
+        self.assertTrue(trading_plan.save_checkpoint())
+        self.assertFalse(trading_plan.save_checkpoint())
+        self.orders = self.exch.get_open_orders('BTC-ETH')
+        self.assertEqual(len(self.orders), 2)
+
+    def tearDown(self):
+        TradingPlan.checkpoint_dir = None
+        shutil.rmtree(self.tmpdir)
+
+    def test_restore(self):
+        trading_plan = TargetsTradingPlan(self.exch, 'targets_tp', ARGS,
+                                          False)
+        self.assertEqual(trading_plan.status, 'up')
+        self.assertEqual(self.exch.get_open_orders('BTC-ETH'), self.orders)
+        trading_plan.remove_checkpoint()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_orders_changed(self):
+        self.exch.cancel_order(self.orders[0])
+        trading_plan = TargetsTradingPlan(self.exch, 'targets_tp', ARGS,
+                                          False)
+        # recovered as before: the orders are canceled
+        self.assertEqual(trading_plan.status, 'unknown')
+        self.assertEqual(self.exch.get_open_orders('BTC-ETH'), [])
+
+    def test_other_args(self):
+        trading_plan = TargetsTradingPlan(self.exch, 'targets_tp',
+                                          ARGS[:-1], False)
+        self.assertEqual(trading_plan.status, 'unknown')
+
+
+class TestSendOrders(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'TBOT_NO_LOG': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed(self):
+        exch = FakeExchange(10, 10, [])
+        trading_plan = TradingPlan(exch, 'trading_plan', ['BTC-ETH'], False)
+        failed = trading_plan.send_orders(
+            [('sell_limit', 'BTC-ETH', 5, 0.0011),
+             ('sell_oco', 'BTC-ETH', 5, 0.0012),
+             ('sell_stop', 'BTC-ETH', 5, 0.0009)])
+        self.assertEqual([order[0] for order, error in failed], ['sell_oco'])
+        self.assertEqual(len(trading_plan.open_orders), 2)
+
+    def test_failed_before_retry(self):
+        exch = FailingExchange([0.0011], 1)
+        trading_plan = TradingPlan(exch, 'trading_plan', ['BTC-ETH'], False)
+        failed = trading_plan.send_orders(
+            [('sell_limit', 'BTC-ETH', 5, 0.0011),
+             ('sell_stop', 'BTC-ETH', 5, 0.0009)])
+        # the error of the first pass is kept after the retry
+        self.assertEqual([(order[0], str(error)) for order, error in failed],
+                         [('sell_limit', 'bad limit')])
+        self.assertEqual(len(trading_plan.open_orders), 1)
+
+    def test_giving_up(self):
+        exch = FailingExchange(funds_errors=10)
+        trading_plan = TradingPlan(exch, 'trading_plan', ['BTC-ETH'], False)
+        failed = trading_plan.send_orders(
+            [('sell_stop', 'BTC-ETH', 5, 0.0009)])
+        self.assertEqual([error.args[0] for order, error in failed],
+                         ['INSUFFICIENT_FUNDS'])
+        self.assertEqual(trading_plan.open_orders, [])
+
+    def test_targets_failed(self):
+        exch = FailingExchange([0.0012])
+        trading_plan = TargetsTradingPlan(exch, 'targets_tp', ARGS, False)
+        trading_plan.tick = candle(0.00101, 0.00102)
+        self.assertTrue(trading_plan.process_tick())
+        # the target placed is kept and the other one is placed again
+        self.assertEqual(trading_plan.status, 'up')
+        placed = exch.get_open_orders('BTC-ETH')
+        self.assertEqual([order.limit for order in placed], [0.0011])
+        exch.bad_limits = ()
+        self.assertTrue(trading_plan.process_tick())
+        orders = exch.get_open_orders('BTC-ETH')
+        self.assertEqual(sorted(order.limit for order in orders),
+                         [0.0011, 0.0012])
+        self.assertIn(placed[0], orders)
+        self.assertEqual(trading_plan.pending_orders, [])
+
+    def test_targets_giving_up(self):
+        exch = FailingExchange([0.0012])
+        trading_plan = TargetsTradingPlan(exch, 'targets_tp', ARGS, False)
+        trading_plan.tick = candle(0.00101, 0.00102)
+        for _ in range(MAX_ORDER_ATTEMPTS - 1):
+            self.assertTrue(trading_plan.process_tick())
+        self.assertFalse(trading_plan.process_tick())
+        self.assertEqual(len(exch.get_open_orders('BTC-ETH')), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# test_trading_plan.py ends here
@@ -1,8 +1,40 @@
 import unittest
 
+import numpy as np
+import pandas as pd
+
+import kernels
+from utils import ATR_STP
+from utils import BB
+from utils import MA
 from utils import str2btc
 
 
+def reference_atr_stp(df):
+    # the pandas implementation the kernels replaced
+    df['TR1'] = abs(df['H'] - df['L'])
+    df['TR2'] = abs(df['H'] - df['C'].shift())
+    df['TR3'] = abs(df['L'] - df['C'].shift())
+    df['TrueRange'] = df[['TR1', 'TR2', 'TR3']].max(axis=1)
+    df['MA'] = df['TrueRange'].rolling(window=20, center=False).mean()
+    atr = (19 * df['MA'].shift() + df['TrueRange']) / 20
+    low = pd.concat([df['L'].shift(k) for k in (1, 2, 3)], axis=1)
+    return low.min(axis=1) - atr / 3
+
+
+def random_frame(size, seed):
+    rnd = np.random.RandomState(seed)
+    close = 0.001 * np.exp(np.cumsum(rnd.normal(0, 0.01, size)))
+    df = pd.DataFrame({'C': close,
+                       'H': close * (1 + abs(rnd.normal(0, 0.01, size))),
+                       'L': close * (1 - abs(rnd.normal(0, 0.01, size))),
+                       'V': rnd.uniform(0, 100, size)})
+    # empty bars from resampling
+    for col in ('C', 'H', 'L'):
+        df.loc[[50, 51, 300], col] = np.nan
+    return df
+
+
 class TestUtils(unittest.TestCase):
 
     def test_str2btc_float(self):
@@ -14,6 +46,40 @@ class TestUtils(unittest.TestCase):
     def test_str2btc_hundred_satoshi(self):
         self.assertEquals(str2btc('146.61S'), 0.00014661)
 
+    def assertSeriesEqual(self, actual, expected):
+        np.testing.assert_allclose(np.asarray(actual, dtype=float),
+                                   np.asarray(expected, dtype=float),
+                                   rtol=1e-9, atol=1e-15)
+
+    def test_ma(self):
+        df = random_frame(1000, 1)
+        MA(df, 20, 'V', 'VMA20')
+        self.assertSeriesEqual(df['VMA20'], df['V'].rolling(20).mean())
+
+    def test_bb(self):
+        df = random_frame(1000, 2)
+        BB(df)
+        mean = df['C'].rolling(20).mean()
+        std = df['C'].rolling(20).std()
+        self.assertSeriesEqual(df['BBM'], mean)
+        self.assertSeriesEqual(df['BBU'], mean + std * 2)
+        self.assertSeriesEqual(df['BBL'], mean - std * 2)
+        self.assertSeriesEqual(df['BBW'], std * 4 / mean)
+
+    def test_atr_stp(self):
+        df = random_frame(1000, 3)
+        ATR_STP(df)
+        self.assertSeriesEqual(df['ATR_STP'], reference_atr_stp(df.copy()))
+        self.assertEqual(list(df.columns), ['C', 'H', 'L', 'V', 'ATR_STP'])
+
+    def test_kernel_output_buffer(self):
+        values = np.arange(10, dtype=np.float64)
+        out = np.empty(10)
+        mean = kernels.rolling_mean(values, 3, out)
+        self.assertIs(mean, out)
+        self.assertEqual(list(out[2:]), [1, 2, 3, 4, 5, 6, 7, 8])
+        self.assertTrue(np.isnan(out[:2]).all())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -4,11 +4,23 @@ import copy
 import importlib
 import gzip
 import json
+import os
 import time
 import traceback
 import sys
 
 from bittrex_exchange import BittrexExchange
+from bittrex_exchange import BittrexOrder
+from bittrex_exchange import shared_dispatch
+from cached_exchange import CachedExchange
+from candle_archive import archive_exchange
+from market_data import Backfill
+from scheduler import PollScheduler
+from scheduler import near_trigger
+from tradefile import TIME_FORMAT
+from tradefile import TradeJournal
+from trading_plan import CHECKPOINT_DIR
+from trading_plan import TradingPlan
 
 
 def load_trading_plan_class(module_name):
@@ -16,54 +28,157 @@ def load_trading_plan_class(module_name):
     return module.trading_plan_class
 
 
+def stream_exchange(exch):
+    '''
+    Get the ticks from the stream at TBOT_STREAM if it is set.
+    '''
+    if os.getenv('TBOT_STREAM'):
+        from stream import StreamExchange
+        return StreamExchange(exch, os.getenv('TBOT_STREAM'))
+    return exch
+
+
+def create_trading_plan(exch, argv):
+    """
+    Instantiate a trading plan from arguments like the ones of trade.py:
+    <trading plan> [-b] <pair> [<args>]
+    """
+    trading_plan_class = load_trading_plan_class(argv[0])
+    buy = (argv[1] == '-b')
+    if buy:
+        args = argv[2:]
+    else:
+        args = argv[1:]
+    return trading_plan_class(exch, argv[0], args, buy)
+
+
+def save_trade(trading_plan, ticks, filename=None):
+    if len(ticks) == 0:
+        return None
+    if not filename:
+        filename = '%s-%s.trade' % (trading_plan.pair, ticks[0]['T'])
+    with gzip.open(filename, 'w') as fout:
+        data = {'candles': ticks,
+                'plan': trading_plan.name,
+                'pair': trading_plan.pair,
+                'balance': trading_plan.balance,
+                'available': trading_plan.available,
+                'args': trading_plan.args}
+        json_str = json.dumps(data) + '\n'
+        json_bytes = json_str.encode('utf-8')
+        fout.write(json_bytes)
+    print('Trade saved in %s' % filename)
+    return filename
+
+
+def open_journal(trading_plan, candles):
+    '''
+    Journal of the session starting with the initial candles.
+    '''
+    if len(candles) > 0:
+        start = candles[0]['T']
+    else:
+        start = time.strftime(TIME_FORMAT, time.gmtime())
+    journal = TradeJournal('%s-%s.trade' % (trading_plan.pair, start),
+                           {'plan': trading_plan.name,
+                            'pair': trading_plan.pair,
+                            'balance': trading_plan.balance,
+                            'available': trading_plan.available,
+                            'args': trading_plan.args})
+    journal.extend(candles)
+    return journal
+
+
+def print_order_stats():
+    print('Order cache: %(hits)d hits %(misses)d misses %(size)d orders '
+          '(%(closed)d closed)' % BittrexOrder.stats())
+
+
+def print_http_stats():
+    stats = shared_dispatch().stats()
+    print('HTTP: %d requests %d connections (%.0f%% reused)' %
+          (stats['requests'], stats['connections'],
+           stats['reuse_rate'] * 100))
+    if 'throttled' in stats:
+        print('Rate limit: %d requests delayed for %.1f s' %
+              (stats['throttled'], stats['waited']))
+
+
+def print_backfill_stats(stats):
+    print('Gaps: %(gaps)d, %(backfilled)d candles backfilled, '
+          '%(lost)d lost' % stats)
+
+
 def main(exch=None):
     if len(sys.argv) < 3:
         print('Usage: %s <trading plan> [-b] <pair> [<args>]' % sys.argv[0])
         sys.exit(1)
-    trading_plan_class = load_trading_plan_class(sys.argv[1])
-    buy = (sys.argv[2] == '-b')
-    if buy:
-        args = sys.argv[3:]
-    else:
-        args = sys.argv[2:]
     if not exch:
-        exch = BittrexExchange(True)
-    trading_plan = trading_plan_class(exch, sys.argv[1], args, buy)
-    ticks = exch.get_candles(trading_plan.pair, 'oneMin')
+        exch = CachedExchange(
+            archive_exchange(stream_exchange(BittrexExchange(True))))
+        # restart live plans from their last state
+        TradingPlan.checkpoint_dir = CHECKPOINT_DIR
+    trading_plan = create_trading_plan(exch, sys.argv[1:])
+    candles = exch.get_candles(trading_plan.pair, 'oneMin')
+
+    backfill = Backfill(exch)
+    journal = open_journal(trading_plan, candles)
+    trading_plan.journal = journal
 
     try:
-        main_loop(exch, trading_plan.pair, trading_plan, ticks)
+        main_loop(exch, trading_plan.pair, trading_plan, journal,
+                  backfill=backfill)
     except KeyboardInterrupt:
         print('\nInterrupted by user')
     except BaseException:
         print(traceback.format_exc())
 
-    if len(ticks) > 0:
-        filename = '%s-%s.trade' % (trading_plan.pair, ticks[0]['T'])
-        with gzip.open(filename, 'w') as fout:
-            data = {'candles': ticks,
-                    'plan': sys.argv[1],
-                    'pair': trading_plan.pair,
-                    'balance': trading_plan.balance,
-                    'available': trading_plan.available,
-                    'args': trading_plan.args}
-            json_str = json.dumps(data) + '\n'
-            json_bytes = json_str.encode('utf-8')
-            fout.write(json_bytes)
-        print('Trade saved in %s' % filename)
-
-
-def main_loop(exch, pair, trading_plan, ticks):
+    journal.close()
+    print('Trade saved in %s' % journal.filename)
+    print_order_stats()
+    print_http_stats()
+    print_backfill_stats(backfill.stats())
+    if isinstance(exch, CachedExchange):
+        print('Exchange cache: %(hits)d hits %(misses)d misses' %
+              exch.stats())
+
+
+def process_candle(exch, pair, trading_plan, ticks, candle):
+    ticks.append(candle)
+    if hasattr(exch, 'archive_candle'):
+        exch.archive_candle(pair, candle)
+    trading_plan.tick = copy.deepcopy(candle)
+    if not trading_plan.process_tick():
+        trading_plan.remove_checkpoint()
+        return False
+    trading_plan.save_checkpoint()
+    return True
+
+
+def main_loop(exch, pair, trading_plan, ticks, scheduler=None,
+              backfill=None):
+    if scheduler is None:
+        scheduler = PollScheduler()
+    if backfill is None:
+        backfill = Backfill(exch)
+    backfill.start(pair, ticks)
     prev_tick = None
     while True:
         tick = exch.get_tick(pair)
+        scheduler.record(pair, tick)
         if tick and tick != prev_tick:
             prev_tick = tick
-            ticks.append(tick)
-            trading_plan.tick = copy.deepcopy(tick)
-            if not trading_plan.process_tick():
-                break
-        time.sleep(30)
+            for candle in backfill.fill(pair, tick):
+                if not process_candle(exch, pair, trading_plan, ticks,
+                                      candle):
+                    return
+        if hasattr(exch, 'wait_tick'):
+            # pushed candles
+            exch.wait_tick(pair, scheduler.max_delay)
+            continue
+        near = prev_tick and near_trigger(prev_tick['C'],
+                                          trading_plan.trigger_levels())
+        time.sleep(scheduler.next_delay(pair, near))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+'''
+Trade files contain the candles seen during a trading session and the
+parameters of the trading plan. They are either a gzip compressed JSON
+document or the columnar format below that can be memory mapped
+without parsing:
+
+- 8 bytes magic
+- 4 bytes little endian length of the JSON metadata
+- JSON metadata (plan, pair, balance, available, args, count)
+- padding to a multiple of 8 bytes
+- count int64 timestamps (seconds since the epoch)
+- count float64 for each of O, H, L, C, V and BV
+
+trade.py streams the session to a journal instead, so that a crash
+loses at most the last few candles:
+
+- 8 bytes magic
+- frames of 4 bytes little endian length, 4 bytes little endian CRC32
+  and that many bytes of zlib compressed JSON lines. The first line of
+  the journal is the metadata (plan, pair, balance, available, args),
+  then each line is {"c": <candle>} or {"e": <event of the plan>}.
+
+A journal is read up to its first truncated or corrupted frame.
+'''
+
+from datetime import datetime
+from datetime import timedelta
+import gzip
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from candles import COLUMNS
+from utils import candle_time
+
+MAGIC = b'TBOTCOL1'
+JOURNAL_MAGIC = b'TBOTJNL1'
+FRAME_HEADER = struct.Struct('<II')
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+CHUNK = 4096
+
+
+def time2str(ts):
+    return (EPOCH + timedelta(seconds=ts)).strftime(TIME_FORMAT)
+
+
+class CandleColumns(object):
+    """
+    Read only sequence of candles stored in columns. Candles are
+    converted to dicts like the ones of the JSON format only when
+    accessed, and slicing does not copy the columns.
+    """
+    def __init__(self, times, values):
+        self.times = times
+        self.values = values
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return CandleColumns(self.times[idx],
+                                 dict((col, self.values[col][idx])
+                                      for col in COLUMNS))
+        candle = dict((col, float(self.values[col][idx]))
+                      for col in COLUMNS)
+        candle['T'] = time2str(int(self.times[idx]))
+        return candle
+
+    def __iter__(self):
+        for start in range(0, len(self.times), CHUNK):
+            times = self.times[start:start + CHUNK].tolist()
+            values = [self.values[col][start:start + CHUNK].tolist()
+                      for col in COLUMNS]
+            for idx, ts in enumerate(times):
+                candle = dict((col, values[pos][idx])
+                              for pos, col in enumerate(COLUMNS))
+                candle['T'] = time2str(ts)
+                yield candle
+
+
+def is_columnar(filename):
+    with open(filename, 'rb') as fin:
+        return fin.read(len(MAGIC)) == MAGIC
+
+
+def _header_size(meta_len):
+    size = len(MAGIC) + 4 + meta_len
+    return size + (-size) % 8
+
+
+def to_columns(candles):
+    """
+    Convert a list of candle dicts to columns, making sure that the
+    conversion is lossless.
+    """
+    times = np.empty(len(candles), dtype=np.int64)
+    values = dict((col, np.empty(len(candles), dtype=np.float64))
+                  for col in COLUMNS)
+    keys = set(COLUMNS + ('T',))
+    for idx, candle in enumerate(candles):
+        if set(candle) != keys:
+            raise ValueError('Unsupported candle %s' % candle)
+        times[idx] = candle_time(candle)
+        if time2str(int(times[idx])) != candle['T']:
+            raise ValueError('Unsupported date format %s' % candle['T'])
+        for col in COLUMNS:
+            values[col][idx] = candle[col]
+    return times, values
+
+
+def write_columnar(filename, data):
+    candles = data['candles']
+    if isinstance(candles, CandleColumns):
+        times, values = candles.times, candles.values
+    else:
+        times, values = to_columns(candles)
+    meta = dict((key, val) for key, val in data.items() if key != 'candles')
+    meta['count'] = len(times)
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    header = MAGIC + struct.pack('<I', len(meta_bytes)) + meta_bytes
+    header += b'\0' * (_header_size(len(meta_bytes)) - len(header))
+    with open(filename, 'wb') as fout:
+        fout.write(header)
+        fout.write(np.ascontiguousarray(times, dtype='<i8').tobytes())
+        for col in COLUMNS:
+            fout.write(np.ascontiguousarray(values[col],
+                                            dtype='<f8').tobytes())
+
+
+def read_columnar(filename):
+    with open(filename, 'rb') as fin:
+        if fin.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a columnar trade file' % filename)
+        meta_len = struct.unpack('<I', fin.read(4))[0]
+        data = json.loads(fin.read(meta_len).decode('utf-8'))
+    count = data.pop('count')
+    offset = _header_size(meta_len)
+    if count == 0:
+        times = np.empty(0, dtype='<i8')
+        values = dict((col, np.empty(0, dtype='<f8')) for col in COLUMNS)
+    else:
+        times = np.memmap(filename, dtype='<i8', mode='r', offset=offset,
+                          shape=(count,))
+        values = {}
+        for idx, col in enumerate(COLUMNS):
+            values[col] = np.memmap(filename, dtype='<f8', mode='r',
+                                    offset=offset + 8 * count * (idx + 1),
+                                    shape=(count,))
+    data['candles'] = CandleColumns(times, values)
+    return data
+
+
+def read_json(filename):
+    with gzip.open(filename, 'r') as fin:
+        json_bytes = fin.read()
+        json_str = json_bytes.decode('utf-8')
+        return json.loads(json_str)
+
+
+def write_json(filename, data):
+    data = dict(data)
+    if isinstance(data['candles'], CandleColumns):
+        data['candles'] = list(data['candles'])
+    with gzip.open(filename, 'w') as fout:
+        json_str = json.dumps(data) + '\n'
+        json_bytes = json_str.encode('utf-8')
+        fout.write(json_bytes)
+
+
+class TradeJournal(object):
+    """
+    Append only trade file written while trading. Candles and events
+    are buffered then written as a frame when frame_records of them
+    are waiting or after flush_interval seconds, and the file is
+    synced to disk at most every fsync_interval seconds. Only the
+    number of candles and the last one are kept in memory.
+    """
+    def __init__(self, filename, meta, frame_records=CHUNK,
+                 flush_interval=30, fsync_interval=300, clock=time.time):
+        self.filename = filename
+        self.frame_records = frame_records
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.clock = clock
+        self.fout = open(filename, 'wb')
+        self.fout.write(JOURNAL_MAGIC)
+        self.lines = [json.dumps(meta)]
+        self.count = 0
+        self.last = None
+        self.last_flush = clock()
+        self.last_fsync = self.last_flush
+        self.frames = 0
+        self.flush()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        # only the last candle is kept in memory
+        if self.count and idx in (-1, self.count - 1):
+            return self.last
+        raise IndexError(idx)
+
+    def append(self, candle):
+        self.count += 1
+        self.last = candle
+        self.write({'c': candle})
+
+    def extend(self, candles):
+        for candle in candles:
+            self.append(candle)
+
+    def event(self, event):
+        self.write({'e': event})
+
+    def write(self, record):
+        self.lines.append(json.dumps(record))
+        if (len(self.lines) >= self.frame_records or
+           self.clock() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            payload = zlib.compress(('\n'.join(self.lines) +
+                                     '\n').encode('utf-8'))
+            self.fout.write(FRAME_HEADER.pack(len(payload),
+                                              zlib.crc32(payload)))
+            self.fout.write(payload)
+            self.fout.flush()
+            self.lines = []
+            self.frames += 1
+        now = self.clock()
+        self.last_flush = now
+        if now - self.last_fsync >= self.fsync_interval:
+            os.fsync(self.fout.fileno())
+            self.last_fsync = now
+
+    def close(self):
+        if not self.fout.closed:
+            self.fsync_interval = 0
+            self.flush()
+            self.fout.close()
+
+
+def is_journal(filename):
+    with open(filename, 'rb') as fin:
+        return fin.read(len(JOURNAL_MAGIC)) == JOURNAL_MAGIC
+
+
+def read_journal(filename):
+    data = None
+    candles = []
+    events = []
+    with open(filename, 'rb') as fin:
+        if fin.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+            raise ValueError('%s is not a trade journal' % filename)
+        while True:
+            header = fin.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            size, crc = FRAME_HEADER.unpack(header)
+            payload = fin.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            try:
+                lines = zlib.decompress(payload).decode('utf-8').splitlines()
+            except zlib.error:
+                break
+            for line in lines:
+                record = json.loads(line)
+                if data is None:
+                    data = record
+                elif 'c' in record:
+                    candles.append(record['c'])
+                else:
+                    events.append(record['e'])
+    if data is None:
+        raise ValueError('%s has no complete frame' % filename)
+    data['candles'] = candles
+    data['events'] = events
+    return data
+
+
+def load_trade(filename):
+    if is_columnar(filename):
+        return read_columnar(filename)
+    if is_journal(filename):
+        return read_journal(filename)
+    return read_json(filename)
+
+
+def main(args):
+    if len(args) != 3 or args[0] not in ('columnar', 'json'):
+        print('Usage: %s columnar|json <input trade file> '
+              '<output trade file>' % sys.argv[0])
+        sys.exit(1)
+    data = load_trade(args[1])
+    if args[0] == 'columnar':
+        write_columnar(args[2], data)
+    else:
+        write_json(args[2], data)
+    print('%d candles saved in %s' % (len(data['candles']), args[2]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+# tradefile.py ends here
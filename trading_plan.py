@@ -2,20 +2,39 @@
 '''
 
 from datetime import datetime
+import hashlib
+import json
 import os
 import re
 
 import pandas as pd
-from pandas.io.json import json_normalize
 
 from bittrex_exchange import BittrexError
+from candles import CandleBuffer
+from exchange import Order
+from resampler import Resampler
 from utils import btc2str
+from utils import candle_time
 
 
 ANSI_ESCAPE = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
 
+# number of minutes of 1 minute candles kept by default (2 weeks)
+DEFAULT_LOOKBACK = 14 * 24 * 60
+# number of bars of the decision period kept in memory
+LOOKBACK_BARS = 25
+# directory of the checkpoints of the plans trading live
+CHECKPOINT_DIR = os.getenv('TBOT_CHECKPOINT_DIR', 'checkpoints')
+
 
 class TradingPlan(object):
+    # attributes saved in the checkpoints, and the ones holding orders
+    # saved by id
+    checkpoint_fields = ()
+    checkpoint_orders = ()
+    # where to save the checkpoints, None when not trading live
+    checkpoint_dir = None
+
     def __init__(self, exch, name, args, buy):
         self.exch = exch
         self.name = name
@@ -23,16 +42,29 @@ class TradingPlan(object):
         self.buy = buy
         if not getattr(self, 'pair', False):
             self.pair = args[0]
+        if not getattr(self, 'lookback', False):
+            self.lookback = DEFAULT_LOOKBACK
+        if os.getenv('TBOT_LOOKBACK'):
+            self.lookback = int(os.getenv('TBOT_LOOKBACK'))
+        if not hasattr(self, 'candles'):
+            self.candles = None
+        if not hasattr(self, 'periods'):
+            self.periods = ()
+        self.resampler = None
         self.args = args
         self.currency = self.pair.split('-')[1]
         self.sent_order = False
+        # TradeJournal recording the decisions and orders if any
+        self.journal = None
+        # last state saved or restored
+        self.checkpoint = None
         self.update_open_orders()
         for order in self.open_orders:
             print(order)
         self.update_position()
         if not os.getenv('TBOT_NO_LOG'):
-            self.file_log = open('%s-%s.log' %
-                                 (self.pair,
+            self.file_log = open('%s-%s-%s.log' %
+                                 (self.pair, self.name,
                                   datetime.now().strftime('%Y%m%d%H%M%S')),
                                  'a')
         else:
@@ -55,6 +87,14 @@ class TradingPlan(object):
         if self.file_log:
             line = ANSI_ESCAPE.sub('', line) + '\n'
             self.file_log.write(line)
+        self.record_event('log', msg=ANSI_ESCAPE.sub('', msg))
+
+    def record_event(self, kind, **data):
+        if self.journal:
+            data['type'] = kind
+            if self.tick:
+                data['T'] = str(self.tick['T'])
+            self.journal.event(data)
 
     def update_position(self):
         position = self.exch.get_position(self.currency)
@@ -76,6 +116,14 @@ class TradingPlan(object):
             self.order = None
         return self.open_orders
 
+    def trigger_levels(self):
+        '''
+        Prices at which the plan has something to do. Used to poll
+        faster when the price gets close to one of them.
+        '''
+        return [order.target if order.is_conditional else order.limit
+                for order in self.open_orders]
+
     def process_tick(self):
         self.log('%s %s-%s' % (btc2str(self.tick['C']),
                                btc2str(self.tick['L']),
@@ -120,9 +168,52 @@ class TradingPlan(object):
             self.update_open_orders()
             if self.order:
                 self.log('New order: %s' % self.order)
+                self.record_event('order', order=str(self.order))
         else:
             self.log('Giving up.')
 
+    def send_orders(self, orders):
+        '''
+        Cancel the current order then place orders together, each a
+        tuple of the name of the exchange method and its arguments.
+        The open orders are read once at the end. Return the orders
+        that failed with their error.
+        '''
+        if self.order:
+            self.do_cancel_order()
+        else:
+            self.log('no order to cancel')
+        failed = []
+        for _ in range(10):
+            results = self.exch.submit_orders(orders)
+            retry = []
+            for order, result in zip(orders, results):
+                if not isinstance(result, Exception):
+                    continue
+                if (isinstance(result, BittrexError) and
+                   result.args[0] == 'INSUFFICIENT_FUNDS'):
+                    retry.append((order, result))
+                else:
+                    failed.append((order, result))
+            if not retry:
+                break
+            # funds of the canceled order not released yet
+            self.update_position()
+            self.log('Insufficient funds: available=%.3f' % self.available)
+            orders = [order for order, _ in retry]
+        else:
+            self.log('Giving up.')
+            failed += retry
+        for order, error in failed:
+            self.log('Unable to place %s%r: %s' % (order[0], order[1:],
+                                                   error))
+        self.sent_order = True
+        self.update_open_orders()
+        for order in self.open_orders:
+            self.log('New order: %s' % order)
+            self.record_event('order', order=str(order))
+        return failed
+
     def monitor_order_completion(self, msg):
         self.update_open_orders()
         if self.order is None:
@@ -151,8 +242,89 @@ class TradingPlan(object):
         if self.order:
             self.exch.cancel_order(self.order)
             print('Canceled order: %s' % self.order)
+            self.record_event('cancel', order=str(self.order))
             self.order = None
 
+    def cancel_orders(self, orders):
+        '''
+        Cancel orders, waiting for their confirmations together.
+        '''
+        pending = []
+        for order in orders:
+            self.log('Canceling %s' % order)
+            pending.append(self.exch.cancel_order_async(order))
+        for future in pending:
+            future.result()
+
+    def checkpoint_filename(self):
+        digest = hashlib.md5(json.dumps([self.args, self.buy]).encode(
+            'utf-8')).hexdigest()[:8]
+        return os.path.join(self.checkpoint_dir, '%s-%s-%s.checkpoint' %
+                            (self.pair, self.name, digest))
+
+    def checkpoint_state(self):
+        state = {'args': self.args, 'buy': self.buy,
+                 'orders': sorted(order.id for order in self.open_orders)}
+        for field in self.checkpoint_fields:
+            state[field] = getattr(self, field, None)
+        for field in self.checkpoint_orders:
+            order = getattr(self, field, None)
+            state[field] = order.id if isinstance(order, Order) else order
+        # copy of the values as they are saved
+        return json.loads(json.dumps(state, default=float))
+
+    def save_checkpoint(self):
+        '''
+        Save the state of the plan if it changed since the last
+        checkpoint.
+        '''
+        if not self.checkpoint_dir:
+            return False
+        state = self.checkpoint_state()
+        if state == self.checkpoint:
+            return False
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        filename = self.checkpoint_filename()
+        with open(filename + '.tmp', 'w') as fout:
+            json.dump(state, fout)
+        os.replace(filename + '.tmp', filename)
+        self.checkpoint = state
+        return True
+
+    def remove_checkpoint(self):
+        if self.checkpoint_dir and os.path.exists(self.checkpoint_filename()):
+            os.remove(self.checkpoint_filename())
+
+    def restore_checkpoint(self):
+        '''
+        Restore the state saved by a previous run of the plan if the
+        open orders did not change since. Return False when the plan
+        has to recover its state from the exchange instead.
+        '''
+        if not self.checkpoint_dir:
+            return False
+        try:
+            with open(self.checkpoint_filename()) as fin:
+                state = json.load(fin)
+        except (OSError, ValueError):
+            return False
+        orders = dict((order.id, order) for order in self.open_orders)
+        if sorted(orders) != state['orders']:
+            self.log('Orders changed since the checkpoint')
+            return False
+        for field in self.checkpoint_orders:
+            if state[field] not in (None, True) and state[field] not in orders:
+                self.log('%s closed since the checkpoint' % field)
+                return False
+        for field in self.checkpoint_fields:
+            setattr(self, field, state[field])
+        for field in self.checkpoint_orders:
+            setattr(self, field, orders.get(state[field], state[field]))
+        self.checkpoint = state
+        self.log('Restored status %s from the checkpoint' %
+                 state.get('status'))
+        return True
+
     def process_tick_buying(self, tick, stop, quantity):
         self.check_order()
         if (self.balance < quantity and
@@ -184,19 +356,34 @@ class TradingPlan(object):
             if not self.sent_order and self.order:
                 print(self.order)
 
+    @property
+    def df(self):
+        if self.candles is None:
+            return None
+        return self.candles.to_dataframe()
+
     def init_dataframes(self):
         candles = self.exch.get_candles(self.pair, 'oneMin')
-        self.df = json_normalize(candles)
-        self.df['T'] = pd.to_datetime(self.df['T'])
-        self.df = self.df.set_index('T')
+        self.candles = CandleBuffer(self.lookback)
+        self.resampler = Resampler(self.periods, LOOKBACK_BARS)
+        for candle in candles:
+            self.feed_candle(candle)
         return candles
 
+    def feed_candle(self, candle):
+        ts = candle_time(candle)
+        self.candles.append(candle, ts)
+        self.resampler.update(candle, ts)
+        if getattr(self, 'indicators', None):
+            self.indicators.update(candle, ts)
+
     def update_dataframe(self, tick):
         tick['T'] = pd.to_datetime(tick['T'])
-        frame = pd.DataFrame(tick, index=[tick['T']])
-        self.df = pd.concat([self.df, frame])
+        self.feed_candle(tick)
 
     def resample_dataframes(self, period):
+        if period in self.resampler:
+            return self.resampler.to_dataframe(period)
         ohlc_dict = {'O': 'first', 'H': 'max', 'L': 'min', 'C': 'last',
                      'V': 'sum', 'BV': 'sum'}
         return self.df.resample(str(period) + 'T').apply(ohlc_dict)
@@ -4,7 +4,9 @@
 import argparse
 import sys
 
+from trading_plan import LOOKBACK_BARS
 from trading_plan import TradingPlan
+from utils import ATR_STP
 from utils import btc2str
 from utils import str2btc
 
@@ -12,48 +14,6 @@ from utils import str2btc
 TEN8 = 100000000
 
 
-def MA(df, n, price='C', name=None):
-    """
-    Moving Average
-    """
-    if not name:
-        name = 'MA_' + str(n)
-    df[name] = df[price].rolling(window=n, center=False).mean()
-    return df
-
-
-def ATR(df, n=20, name=None):
-    if name is None:
-        name = 'ATR_%d' % n
-    df['TR1'] = abs(df['H'] - df['L'])
-    df['TR2'] = abs(df['H'] - df['C'].shift())
-    df['TR3'] = abs(df['L'] - df['C'].shift())
-    df['TrueRange'] = df[['TR1', 'TR2', 'TR3']].max(axis=1)
-    MA(df, n, price='TrueRange', name=name)
-    df[name] = ((n - 1) * df[name].shift() + df['TrueRange']) / n
-    del df['TR1']
-    del df['TR2']
-    del df['TR3']
-    del df['TrueRange']
-    return df
-
-
-def ATR_STP(df, name=None):
-    if name is None:
-        name = 'ATR_STP'
-    ATR(df)
-    df['L1'] = df['L'].shift()
-    df['L2'] = df['L'].shift(2)
-    df['L3'] = df['L'].shift(3)
-    df[name] = (df[['L1', 'L2', 'L3']].min(axis=1) -
-                (df['ATR_20'] / 3))
-    del df['L1']
-    del df['L2']
-    del df['L3']
-    del df['ATR_20']
-    return df
-
-
 class TrailingTradingPlan(TradingPlan):
     def __init__(self, exch, name, arguments, buy):
         parser = argparse.ArgumentParser(prog=name)
@@ -81,8 +41,12 @@ class TrailingTradingPlan(TradingPlan):
         self.target_price = str2btc(args.target)
         self.trail_price = None
         self.trailing = args.trailing
-        self.df = None
         self.period = args.period
+        self.lookback = LOOKBACK_BARS * self.period
+        # periods used by compute_stop when downsampling
+        self.periods = [self.period]
+        while self.periods[-1] // 2 > 15:
+            self.periods.append(self.periods[-1] // 2)
         self.range = args.range
         self.tick = None
 
@@ -138,7 +102,7 @@ class TrailingTradingPlan(TradingPlan):
                     return False
 
                 # do the trend following
-                if self.df is None:
+                if self.candles is None:
                     self.init_dataframes()
 
                 self.update_dataframe(tick)
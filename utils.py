@@ -1,8 +1,14 @@
 '''
 '''
 
+from calendar import timegm
+from datetime import datetime
+from functools import lru_cache
+
 from colored import (stylize, fg)
 
+import kernels
+
 
 def btc2str(val):
     if val:
@@ -23,57 +29,55 @@ def str2btc(s):
     return val
 
 
+def candle_time(candle):
+    """
+    Timestamp of a candle in seconds since the epoch
+    """
+    ts = candle['T']
+    if isinstance(ts, str):
+        ts = datetime.strptime(ts[:19], '%Y-%m-%dT%H:%M:%S')
+    return timegm(ts.timetuple())
+
+
 def MA(df, n, price='C', name=None):
     """
     Moving Average
     """
     if not name:
         name = 'MA_' + str(n)
-    df[name] = df[price].rolling(window=n, center=False).mean()
+    df[name] = kernels.rolling_mean(kernels.as_array(df[price]), n)
     return df
 
 
 def ATR(df, n=20, name=None):
     if name is None:
         name = 'ATR_%d' % n
-    df['TR1'] = abs(df['H'] - df['L'])
-    df['TR2'] = abs(df['H'] - df['C'].shift())
-    df['TR3'] = abs(df['L'] - df['C'].shift())
-    df['TrueRange'] = df[['TR1', 'TR2', 'TR3']].max(axis=1)
-    MA(df, n, price='TrueRange', name=name)
-    df[name] = ((n - 1) * df[name].shift() + df['TrueRange']) / n
-    del df['TR1']
-    del df['TR2']
-    del df['TR3']
-    del df['TrueRange']
+    df[name] = kernels.atr(kernels.as_array(df['H']),
+                           kernels.as_array(df['L']),
+                           kernels.as_array(df['C']), n)
     return df
 
 
 def ATR_STP(df, name=None):
     if name is None:
         name = 'ATR_STP'
-    ATR(df)
-    df['L1'] = df['L'].shift()
-    df['L2'] = df['L'].shift(2)
-    df['L3'] = df['L'].shift(3)
-    df[name] = (df[['L1', 'L2', 'L3']].min(axis=1) -
-                (df['ATR_20'] / 3))
-    del df['L1']
-    del df['L2']
-    del df['L3']
-    del df['ATR_20']
+    df[name] = kernels.atr_stop(kernels.as_array(df['H']),
+                                kernels.as_array(df['L']),
+                                kernels.as_array(df['C']))
     return df
 
 
 def BB(df, price='C', length=20, numsd=2):
     """ returns average, upper band, and lower band"""
-    df['BBM'] = df[price].rolling(window=length, center=False).mean()
-    df['BBU'] = (df[price].rolling(window=length, center=False).mean() +
-                 df[price].rolling(window=length, center=False).std() * numsd)
-    df['BBL'] = (df[price].rolling(window=length, center=False).mean() -
-                 df[price].rolling(window=length, center=False).std() * numsd)
-    df['BBW'] = df[price].rolling(window=length,
-                                  center=False).std() * 2 * numsd / df['BBM']
+    mean, std = kernels.rolling_mean_std(kernels.as_array(df[price]),
+                                         length)
+    std *= numsd
+    df['BBM'] = mean
+    df['BBU'] = mean + std
+    df['BBL'] = mean - std
+    std *= 2
+    std /= mean
+    df['BBW'] = std
     return df
 
 
@@ -93,10 +97,13 @@ def RSI(df, column='C', period=14):
     return df
 
 
+# the plans color the same few words on every tick
+@lru_cache(maxsize=None)
 def red(s):
     return stylize(s, fg('red'))
 
 
+@lru_cache(maxsize=None)
 def green(s):
     return stylize(s, fg('green'))
 